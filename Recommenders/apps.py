@@ -0,0 +1,7 @@
+from django.apps import AppConfig
+
+
+class RecommendersConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'Recommenders'
+    label = 'recommenders'
@@ -0,0 +1,153 @@
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Sum
+from places.models import Place
+from places.feeds import random_sample
+from reviews.models import Review
+from .models import PlaceNeighbor
+
+# Item-item collaborative filtering.
+# Offline: build a sparse users x places matrix from reviews and favorites,
+# take cosine similarity between place columns and keep the top-N neighbors
+# of every place in PlaceNeighbor. Online: sum the neighbor scores of the
+# places a user liked, which is one indexed query.
+
+FAVORITE_WEIGHT = 1.0
+LIKED_RATING = 4
+HISTORY_LIMIT = 50
+
+
+def interaction_matrix():
+    """
+    Return (matrix, place_ids): a CSR users x places matrix of interaction
+    strength in [0, 1] and the Place id behind every column.
+    """
+    reviews = Review.objects.values_list('user_id', 'place_id', 'rating')
+    favorites = Place.favorites.through.objects.values_list('user_id', 'place_id')
+    review_rows = np.array(list(reviews.iterator(chunk_size=10000)), dtype=np.int64).reshape(-1, 3)
+    favorite_rows = np.array(list(favorites.iterator(chunk_size=10000)), dtype=np.int64).reshape(-1, 2)
+
+    users = np.concatenate([review_rows[:, 0], favorite_rows[:, 0]])
+    places = np.concatenate([review_rows[:, 1], favorite_rows[:, 1]])
+    values = np.concatenate([
+        review_rows[:, 2].astype(np.float32) / 5,
+        np.full(len(favorite_rows), FAVORITE_WEIGHT, dtype=np.float32),
+    ])
+    user_ids, user_index = np.unique(users, return_inverse=True)
+    place_ids, place_index = np.unique(places, return_inverse=True)
+    matrix = sparse.coo_matrix(
+        (values, (user_index, place_index)), shape=(len(user_ids), len(place_ids)),
+    ).tocsr()
+    # Repeat reviews and a favorite on top of a review add up; cap at 1
+    np.minimum(matrix.data, 1.0, out=matrix.data)
+    return matrix, place_ids
+
+
+def affected_columns(matrix, place_ids, stale_ids):
+    """
+    Columns whose neighbor lists can change when `stale_ids` change: the
+    stale places, every place sharing a user with them, and every place
+    that currently lists one of them as a neighbor.
+    """
+    stale_cols = np.flatnonzero(np.isin(place_ids, list(stale_ids)))
+    users = np.unique(matrix[:, stale_cols].nonzero()[0])
+    co_cols = np.unique(matrix[users].nonzero()[1])
+    listed = PlaceNeighbor.objects.filter(neighbor_id__in=stale_ids).values_list('place_id', flat=True)
+    listed_cols = np.flatnonzero(np.isin(place_ids, list(listed)))
+    return np.unique(np.concatenate([stale_cols, co_cols, listed_cols]))
+
+
+def build(stale_ids=None, top_n=None, min_score=None, chunk_size=500):
+    """
+    Rebuild PlaceNeighbor rows. With `stale_ids`, only the places affected by
+    those ids are recomputed; otherwise every place is. Returns the number of
+    places whose neighbor lists were written.
+    """
+    top_n = top_n or settings.RECOMMENDER_TOP_N
+    min_score = settings.RECOMMENDER_MIN_SCORE if min_score is None else min_score
+    matrix, place_ids = interaction_matrix()
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    inverse = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    normalized = (matrix @ sparse.diags(inverse)).tocsr()
+    by_column = normalized.tocsc()
+
+    if stale_ids is None:
+        columns = np.arange(len(place_ids))
+        # Rows that survive the rewrite below belong to places with no interactions left
+        leftover_below = PlaceNeighbor.objects.aggregate(last=Max('id'))['last'] or 0
+    else:
+        columns = affected_columns(matrix, place_ids, stale_ids)
+        # Stale places with no interactions left have no column at all
+        gone = set(stale_ids) - set(place_ids.tolist())
+        PlaceNeighbor.objects.filter(place_id__in=gone).delete()
+
+    for start in range(0, len(columns), chunk_size):
+        chunk = columns[start:start + chunk_size]
+        similarity = (by_column[:, chunk].T @ normalized).tocsr()
+        rows = []
+        for offset, column in enumerate(chunk.tolist()):
+            begin, end = similarity.indptr[offset], similarity.indptr[offset + 1]
+            neighbors, scores = similarity.indices[begin:end], similarity.data[begin:end]
+            keep = (neighbors != column) & (scores >= min_score)
+            neighbors, scores = neighbors[keep], scores[keep]
+            if len(scores) > top_n:
+                best = np.argpartition(-scores, top_n)[:top_n]
+                neighbors, scores = neighbors[best], scores[best]
+            place_id = int(place_ids[column])
+            rows.extend(
+                PlaceNeighbor(place_id=place_id, neighbor_id=int(place_ids[neighbor]), score=float(score))
+                for neighbor, score in zip(neighbors.tolist(), scores.tolist())
+            )
+        chunk_place_ids = place_ids[chunk].tolist()
+        with transaction.atomic():
+            PlaceNeighbor.objects.filter(place_id__in=chunk_place_ids).delete()
+            PlaceNeighbor.objects.bulk_create(rows, batch_size=1000)
+    if stale_ids is None:
+        PlaceNeighbor.objects.filter(id__lte=leftover_below).delete()
+    return len(columns)
+
+
+def popular_nearby(lat, lon, k, exclude=()):
+    places = Place.objects.filter(is_approved=True).within(lat, lon, settings.NEARBY_RADIUS_KM)
+    return list(places.exclude(id__in=exclude).order_by('-average_rating', '-review_count')[:k])
+
+
+def recommend(user, lat, lon, k=10):
+    """
+    Top `k` places for `user`: neighbors of the places they rated highly or
+    favorited, topped up with popular places nearby for cold-start users.
+    """
+    liked = set()
+    if user.is_authenticated:
+        liked.update(
+            Review.objects.filter(user=user, rating__gte=LIKED_RATING)
+            .order_by('-created_at').values_list('place_id', flat=True)[:HISTORY_LIMIT]
+        )
+        liked.update(user.favorite_places.values_list('id', flat=True)[:HISTORY_LIMIT])
+
+    places = []
+    if liked:
+        scored = (
+            PlaceNeighbor.objects.filter(place_id__in=liked, neighbor__is_approved=True)
+            .exclude(neighbor_id__in=liked)
+            .exclude(neighbor_id__in=Review.objects.filter(user=user).values('place_id'))
+            .values('neighbor_id')
+            .annotate(total=Sum('score'))
+            .order_by('-total', 'neighbor_id')[:k]
+        )
+        ids = [row['neighbor_id'] for row in scored]
+        by_id = Place.objects.in_bulk(ids)
+        places = [by_id[pk] for pk in ids if pk in by_id]
+
+    if len(places) < k:
+        seen = liked | {place.pk for place in places}
+        places += popular_nearby(lat, lon, k - len(places), exclude=seen)
+    if len(places) < k:
+        # Nothing around this location either; anything approved beats an empty row
+        seen = liked | {place.pk for place in places}
+        pool = Place.objects.filter(is_approved=True).exclude(id__in=seen)
+        places += random_sample(pool, k - len(places))
+    return places
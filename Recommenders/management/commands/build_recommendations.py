@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from places import feeds
+from Recommenders import engine
+from Recommenders.models import StalePlace
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the item-item neighbor table, only for places that changed unless --full is given.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompute every place instead of only stale ones.')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        started = timezone.now()
+        if options['full']:
+            stale_ids = None
+            self.stdout.write('Rebuilding neighbors for every place...')
+        else:
+            stale_ids = set(StalePlace.objects.values_list('place_id', flat=True))
+            if not stale_ids:
+                self.stdout.write(self.style.SUCCESS('No stale places, nothing to do.'))
+                return
+            self.stdout.write(f'Rebuilding neighbors around {len(stale_ids)} stale places...')
+
+        count = engine.build(stale_ids, chunk_size=options['chunk_size'])
+        # Places marked again while we were building stay queued for next time
+        StalePlace.objects.filter(marked_at__lte=started).delete()
+        feeds.invalidate('recommendations')
+        self.stdout.write(self.style.SUCCESS(f'Wrote neighbor lists for {count} places.'))
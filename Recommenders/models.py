@@ -0,0 +1,51 @@
+from django.db import models
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from places.models import Place
+
+
+class PlaceNeighbor(models.Model):
+    """Precomputed top-N item-item similarity, one row per (place, neighbor)."""
+    place = models.ForeignKey(Place, on_delete=models.CASCADE, related_name='neighbors')
+    neighbor = models.ForeignKey(Place, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ('place', 'neighbor')
+        indexes = [models.Index(fields=['place', '-score'])]
+
+    def __str__(self):
+        return f"{self.place_id} -> {self.neighbor_id} ({self.score:.3f})"
+
+
+class StalePlace(models.Model):
+    """Places whose interactions changed since the last build_recommendations run."""
+    place = models.OneToOneField(Place, on_delete=models.CASCADE, primary_key=True)
+    marked_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def mark(cls, place_ids):
+        # Refresh marked_at on conflict so a build that is already running
+        # does not clear marks that arrived after it started
+        cls.objects.bulk_create(
+            [cls(place_id=pk) for pk in place_ids],
+            update_conflicts=True, update_fields=['marked_at'], unique_fields=['place'],
+        )
+
+
+# Track which places need their neighbor lists rebuilt
+@receiver(post_save, sender='reviews.Review')
+@receiver(post_delete, sender='reviews.Review')
+def mark_reviewed_place(sender, instance, **kwargs):
+    StalePlace.mark({instance.place_id, instance._loaded_place_id} - {None})
+
+@receiver(m2m_changed, sender=Place.favorites.through)
+def mark_favorited_places(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            StalePlace.mark([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        StalePlace.mark(pk_set)
+    elif action == 'pre_clear':
+        # pk_set is not provided on clear, so look the user's favorites up first
+        StalePlace.mark(instance.favorite_places.values_list('id', flat=True))
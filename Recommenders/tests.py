@@ -0,0 +1,66 @@
+from io import StringIO
+from django.test import TestCase
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from places.models import Place
+from places.testing import make_place
+from reviews.models import Review
+from .models import PlaceNeighbor, StalePlace
+from . import engine
+
+User = get_user_model()
+
+
+class RecommenderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice, cls.bob, cls.carol = (
+            User.objects.create_user(username=name, password='pass') for name in ('alice', 'bob', 'carol')
+        )
+        cls.mess, cls.bakery, cls.cafe, cls.hotel = (
+            make_place(name, 11.0168, 76.9558) for name in ('Mess', 'Bakery', 'Cafe', 'Hotel')
+        )
+        # Alice and Bob both like the mess and the bakery; Bob also likes the cafe
+        for user, place in ((cls.alice, cls.mess), (cls.bob, cls.mess), (cls.bob, cls.bakery), (cls.bob, cls.cafe)):
+            Review.objects.create(user=user, place=place, rating=5)
+        cls.alice.favorite_places.add(cls.bakery)
+        Place.objects.filter(pk=cls.hotel.pk).update(average_rating=5.0, review_count=10)
+
+    def test_reviews_and_favorites_mark_places_stale(self):
+        self.assertEqual(
+            set(StalePlace.objects.values_list('place_id', flat=True)),
+            {self.mess.pk, self.bakery.pk, self.cafe.pk},
+        )
+
+    def test_moved_and_bulk_created_reviews_mark_places_stale(self):
+        StalePlace.objects.all().delete()
+        review = Review.objects.get(user=self.alice, place=self.mess)
+        review.place = self.hotel
+        review.save()
+        self.assertEqual(set(StalePlace.objects.values_list('place_id', flat=True)), {self.mess.pk, self.hotel.pk})
+        StalePlace.objects.all().delete()
+        Review.objects.bulk_create([Review(user=self.carol, place=self.cafe, rating=4)])
+        self.assertEqual(list(StalePlace.objects.values_list('place_id', flat=True)), [self.cafe.pk])
+
+    def test_full_build_and_serving(self):
+        call_command('build_recommendations', '--full', stdout=StringIO())
+        neighbors = PlaceNeighbor.objects.filter(place=self.mess).order_by('-score')
+        self.assertEqual([n.neighbor_id for n in neighbors], [self.bakery.pk, self.cafe.pk])
+        self.assertFalse(StalePlace.objects.exists())
+
+        # Alice liked the mess and bakery, so Bob's cafe comes first, then popular fill-in
+        recommended = engine.recommend(self.alice, 11.0168, 76.9558, k=2)
+        self.assertEqual(recommended, [self.cafe, self.hotel])
+
+    def test_incremental_build_matches_full(self):
+        call_command('build_recommendations', '--full', stdout=StringIO())
+        Review.objects.create(user=self.carol, place=self.cafe, rating=5)
+        Review.objects.create(user=self.carol, place=self.hotel, rating=4)
+        call_command('build_recommendations', stdout=StringIO())
+        incremental = set(PlaceNeighbor.objects.values_list('place_id', 'neighbor_id'))
+        call_command('build_recommendations', '--full', stdout=StringIO())
+        self.assertEqual(incremental, set(PlaceNeighbor.objects.values_list('place_id', 'neighbor_id')))
+
+    def test_cold_start_falls_back_to_popular_nearby(self):
+        recommended = engine.recommend(self.carol, 11.0168, 76.9558, k=1)
+        self.assertEqual(recommended, [self.hotel])
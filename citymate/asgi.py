@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'citymate.settings')
+# Serve the async versions of the main place pages
+os.environ.setdefault('CITYMATE_URLCONF', 'citymate.asgi_urls')
 
 application = get_asgi_application()
@@ -0,0 +1,13 @@
+from django.urls import path
+from places import async_views
+from .urls import urlpatterns as wsgi_urlpatterns
+
+# ROOT_URLCONF under ASGI (see asgi.py): the same site as citymate.urls,
+# except that the read-heavy place pages are served by their async views.
+# They come first, so they win over the sync views further down.
+urlpatterns = [
+    path('places/', async_views.HomeView.as_view(), name='home'),
+    path('places/search/', async_views.SearchView.as_view(), name='search'),
+    path('places/<int:pk>/', async_views.PlaceDetailView.as_view(), name='place_detail'),
+    *wsgi_urlpatterns,
+]
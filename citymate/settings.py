@@ -2,6 +2,8 @@ import os
 from datetime import timedelta
 from pathlib import Path
 
+from .db import database_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -28,7 +30,6 @@ INSTALLED_APPS = [
     'django.contrib.sites',  # Required for allauth
     'rest_framework',
     'rest_framework_simplejwt',
-    'ratelimit',
     'allauth',
     'allauth.account',
     'allauth.socialaccount',
@@ -36,6 +37,7 @@ INSTALLED_APPS = [
     'users',  
     'places',  
     'reviews',  
+    'Recommenders',
 ]
 
 SITE_ID = 1
@@ -52,7 +54,8 @@ MIDDLEWARE = [
     # For allauth All type of Authentication
 ]
 
-ROOT_URLCONF = 'citymate.urls'
+# asgi.py switches to citymate.asgi_urls, which serves the async views
+ROOT_URLCONF = os.environ.get('CITYMATE_URLCONF', 'citymate.urls')
 
 TEMPLATES = [
     {
@@ -75,12 +78,47 @@ WSGI_APPLICATION = 'citymate.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# SQLite in the project directory unless DATABASE_URL is set, e.g.
+# postgres://citymate:secret@db:5432/citymate. DATABASE_REPLICA_URLS is a
+# comma-separated list of read replicas; two local SQLite files work too
+# (sqlite:///replica.sqlite3) for trying the routing out.
+
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))  # seconds a connection is reused; 0 closes it per request
+# WAL, busy_timeout and BEGIN IMMEDIATE for SQLite serving real traffic (see citymate/db.py)
+SQLITE_PRODUCTION = os.environ.get('SQLITE_PRODUCTION', '').lower() in ('1', 'true', 'yes')
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(
+        os.environ.get('DATABASE_URL', f"sqlite:///{BASE_DIR / 'db.sqlite3'}"), DB_CONN_MAX_AGE, SQLITE_PRODUCTION,
+    ),
 }
+DATABASE_REPLICAS = []
+for index, url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(','))):
+    alias = f'replica{index + 1}'
+    # In tests a replica is the test database itself rather than a copy of it
+    DATABASES[alias] = {**database_config(url.strip(), DB_CONN_MAX_AGE, SQLITE_PRODUCTION), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['citymate.db.ReplicaRouter']
+READ_YOUR_WRITES_SECONDS = 10  # after a review post, that user's reads skip the replicas for this long
+# (and listings read from a replica go without an ETag this long after any write)
+
+# Cache
+# Local memory is per-process; point REDIS_URL at a shared Redis in production
+# so feed invalidation reaches every worker.
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -116,6 +154,12 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded files. Place photo variants are content-addressed (places/images.py),
+# so their URLs can be cached forever.
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+PHOTO_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -125,15 +169,20 @@ AUTH_USER_MODEL = 'users.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'places.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
 }
+USER_CACHE_TTL = 300  # seconds a user resolved for a JWT request stays cached; saves refresh it
 
 AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',
@@ -167,5 +216,48 @@ TWILIO_ACCOUNT_SID = 'your-twilio-sid'
 TWILIO_AUTH_TOKEN = 'your-twilio-token'
 TWILIO_PHONE_NUMBER = '+1234567890'  # Your Twilio number
 
+# One-time codes (users/otp.py)
+OTP_STORE = 'users.otp.DatabaseOTPStore'  # or users.otp.CacheOTPStore to keep codes out of the database
+OTP_TTL_SECONDS = 600
+OTP_MAX_ATTEMPTS = 5  # wrong guesses before a code is thrown away
+
+# Outbound OTP queue (users/outbound.py), drained by `manage.py process_outbound`
+OUTBOUND_BACKENDS = {
+    'email': 'users.outbound.EmailBackend',
+    'sms': 'users.outbound.TwilioSMSBackend',
+}  # users.outbound.ConsoleBackend / FileBackend for local development
+OUTBOUND_FILE_PATH = BASE_DIR / 'outbound.jsonl'
+OUTBOUND_BATCH_SIZE = 50
+OUTBOUND_MAX_ATTEMPTS = 5
+OUTBOUND_RETRY_BASE_SECONDS = 30  # doubles after every failed attempt
+OUTBOUND_RETRY_MAX_SECONDS = 3600
+OUTBOUND_LEASE_SECONDS = 300  # a row stuck in 'sending' this long is retried
+
 # Rate Limiting
-RATELIMIT_ENABLE = True
\ No newline at end of file
+RATELIMIT_ENABLE = True
+RATELIMIT_CACHE = 'default'  # must be shared by all workers (Redis) for limits to be global
+RATELIMIT_IP_META_KEY = 'REMOTE_ADDR'  # e.g. 'HTTP_X_FORWARDED_FOR' behind a trusted proxy
+RATELIMIT_TRUSTED_PROXIES = 1  # proxies in front of the app that append to RATELIMIT_IP_META_KEY
+
+# Places
+CITYMATE_DEFAULT_LOCATION = (11.0168, 76.9558)  # Coimbatore, used until we know where the user is
+NEARBY_RADIUS_KM = 5
+NEARBY_MAX_RADIUS_KM = 50
+PLACES_PAGE_SIZE = 20
+PLACES_MAX_PAGE_SIZE = 50
+DISTANCE_RING_KM = 2  # first ring read for a page of search?sort=distance, widened until it holds the page
+PLACES_SEARCH_BACKEND = 'places.search.FTS5SearchBackend'  # or places.search.LikeSearchBackend
+PLACES_SEARCH_RATING_BOOST = 0.1  # a 5-star place ranks 1.5x higher than an unrated one with the same text match
+FEED_CACHE_TTL = 300  # seconds; writes invalidate sooner
+# ETags on search and the JSON listings come from a version in the default
+# cache. None sends them only when that cache is shared by every worker (not
+# LocMemCache); True forces them on, e.g. for a single-process server.
+LISTING_ETAGS = None
+DUPLICATE_RADIUS_KM = 0.1  # places further apart than this are never the same place
+DUPLICATE_MIN_SIMILARITY = 0.5  # name trigram overlap (Jaccard) that counts as a likely duplicate
+PLACE_REVIEWS_PAGE_SIZE = 10  # reviews on the place page and per "load more"
+REVIEW_FRAGMENT_TTL = 600  # seconds the rendered first page of reviews is cached; review writes retire it
+
+# Recommenders
+RECOMMENDER_TOP_N = 20  # neighbors kept per place
+RECOMMENDER_MIN_SCORE = 0.05  # cosine similarity below this is noise
@@ -1,9 +1,14 @@
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+from places.views import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('users.urls')),  # Include users URLs at root
     path('places/', include('places.urls')),  # Assuming you have these
-    path('reviews/', include('reviews.urls')),
-]
\ No newline at end of file
+]
+
+if settings.DEBUG:
+    # In production the web server serves MEDIA_ROOT, with PHOTO_CACHE_CONTROL on place_photos/
+    urlpatterns += [re_path(r'^media/(?P<path>.*)$', serve_media)]
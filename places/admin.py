@@ -1,18 +1,48 @@
-from django.contrib import admin
-from .models import Place
+from django.contrib import admin, messages
+from django.db.models import F
+from django.utils import timezone
+from .models import Place, Tag
+from . import dedup, feeds, moderation
 
 class PlaceAdmin(admin.ModelAdmin):
     list_display = ('name', 'type', 'sub_type', 'price_level', 'is_approved', 'average_rating', 'added_by')
     list_filter = ('type', 'sub_type', 'price_level', 'is_approved', 'reported')
     search_fields = ('name', 'address', 'description')
-    actions = ['approve_places', 'mark_reported']
+    actions = ['approve_places', 'reject_places', 'mark_reported', 'merge_duplicates']
+    # An exact COUNT(*) of the whole table on every changelist page gets slow;
+    # the moderation queue (places/moderation/) is the place to work through backlogs
+    show_full_result_count = False
 
     def approve_places(self, request, queryset):
-        queryset.update(is_approved=True)
+        # Through moderation so feeds and conditional GET validators move too
+        moderation.approve(list(queryset.values_list('id', flat=True)))
     approve_places.short_description = "Approve selected places"
 
+    def reject_places(self, request, queryset):
+        rejected = moderation.reject(list(queryset.values_list('id', flat=True)))
+        self.message_user(request, f"Rejected {rejected} places.")
+    reject_places.short_description = "Reject (delete) selected pending or reported places"
+
     def mark_reported(self, request, queryset):
-        queryset.update(reported=True)
+        # Bypasses save(), so move the validators and feeds on by hand
+        queryset.update(reported=True, version=F('version') + 1, updated_at=timezone.now())
+        feeds.invalidate()
     mark_reported.short_description = "Mark selected as reported"
 
-admin.site.register(Place, PlaceAdmin)
\ No newline at end of file
+    def merge_duplicates(self, request, queryset):
+        places = list(queryset)
+        if len(places) < 2:
+            self.message_user(request, "Select at least two places to merge.", messages.WARNING)
+            return
+        survivor = dedup.pick_survivor(places)
+        merged = dedup.merge_places(survivor, places)
+        self.message_user(request, f"Merged {merged} duplicates into {survivor.name} (#{survivor.pk}).")
+    merge_duplicates.short_description = "Merge selected into one place"
+
+admin.site.register(Place, PlaceAdmin)
+
+class TagAdmin(admin.ModelAdmin):
+    list_display = ('name',)
+    search_fields = ('name',)
+
+admin.site.register(Tag, TagAdmin)
@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class PlacesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'places'
+
+    def ready(self):
+        from . import feeds  # noqa: F401  registers the feed invalidation receivers
+        post_migrate.connect(setup_search_backend, sender=self)
+
+
+def setup_search_backend(sender, using='default', **kwargs):
+    from .search import get_search_backend
+    get_search_backend().setup()
@@ -0,0 +1,128 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.core.cache import cache
+from django.http import Http404, HttpResponseBadRequest
+from django.shortcuts import render
+from django.utils.decorators import method_decorator
+from django.utils.safestring import mark_safe
+from django.views import View
+
+from . import feeds, geo, views
+from .conditional import async_listing_condition, async_place_condition
+from .models import Place, alist
+from .pagination import InvalidCursor, apaginate_queryset
+from citymate.db import replica_reads
+from reviews.forms import ReviewFormForDetailPage
+from reviews.models import REVIEW_ORDERING, Review
+
+# Async versions of the home, search and place pages, served under ASGI
+# (see citymate/asgi_urls.py). They use the async ORM and cache APIs and
+# await independent reads together: the three home feeds, search facets
+# and results, the place and its first page of reviews. Unlike a sync
+# view under ASGI, the view itself never runs in a worker thread. Django's
+# async ORM and cache still run each call through sync_to_async on one
+# shared thread, so the gathered queries overlap their waits rather than
+# run in parallel; benchmark_views --asgi compares both paths.
+
+
+class AsyncLoginRequiredMixin:
+    """LoginRequiredMixin for async views, loading the user with the async session API."""
+
+    async def dispatch(self, request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        # Templates and context processors read request.user; a loaded user
+        # keeps them from querying (which they can't do on the event loop).
+        # auser() also loaded the session, so reading it from here on is
+        # plain dict access.
+        request.user = user
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class HomeView(AsyncLoginRequiredMixin, View):
+    @method_decorator(replica_reads)
+    async def get(self, request):
+        try:
+            lat, lon = views.get_user_location(request)
+        except geo.InvalidLocation as e:
+            return HttpResponseBadRequest(str(e))
+        trending_places, nearby_places, recommendations = await asyncio.gather(
+            feeds.atrending(),
+            feeds.anearby(lat, lon),
+            feeds.arecommendations(request.user, lat, lon),
+        )
+        return render(request, 'places/home.html', {
+            'trending_places': trending_places,
+            'nearby_places': nearby_places,
+            'recommendations': recommendations,
+        })
+
+
+async def search_places(request, places=None):
+    """views.search_places() with the facet and result queries awaited together."""
+    search = views.prepare_search(request, places)
+    rows = search['rows'].apage() if search['sort'] == 'distance' else alist(search['rows'])
+    facets, rows = await asyncio.gather(alist(search['facets']), rows)
+    return views.finish_search(search, facets, rows)
+
+
+class SearchView(AsyncLoginRequiredMixin, View):
+    @method_decorator(replica_reads)
+    @method_decorator(async_listing_condition)
+    async def get(self, request):
+        try:
+            context = await search_places(request)
+        except InvalidCursor:
+            return HttpResponseBadRequest('Invalid cursor')
+        except geo.InvalidLocation as e:
+            return HttpResponseBadRequest(str(e))
+        if context['next_cursor']:
+            params = request.GET.copy()
+            params['cursor'] = context['next_cursor']
+            context['next_query'] = params.urlencode()
+        return render(request, 'places/search.html', context)
+
+
+async def first_review_page(place_id, version, updated_at):
+    """views.first_review_page() for a place known only by its id and marker."""
+    key = views.review_page_key(place_id, version, updated_at)
+    html = await cache.aget(key)
+    if html is None:
+        reviews, next_cursor = await apaginate_queryset(
+            Review.objects.for_place(place_id), REVIEW_ORDERING, 'reviews', None, settings.PLACE_REVIEWS_PAGE_SIZE,
+        )
+        html = views.render_review_page(place_id, reviews, next_cursor, first_page=True)
+        await cache.aset(key, html, settings.REVIEW_FRAGMENT_TTL)
+    return mark_safe(html)
+
+
+async def get_place(pk):
+    try:
+        return await Place.objects.aget(pk=pk)
+    except Place.DoesNotExist:
+        raise Http404('No Place matches the given query.')
+
+
+class PlaceDetailView(AsyncLoginRequiredMixin, View):
+    @method_decorator(replica_reads)
+    @method_decorator(async_place_condition)
+    async def get(self, request, pk):
+        # The conditional GET already read the place's version, which is all
+        # the review fragment's cache key needs, so both reads go out at once
+        marker = request._place_marker
+        if marker is None:
+            raise Http404('No Place matches the given query.')
+        place, reviews_html = await asyncio.gather(get_place(pk), first_review_page(pk, *marker))
+        return render(request, 'places/place_detail.html', {
+            'place': place, 'review_form': ReviewFormForDetailPage(), 'reviews_html': reviews_html,
+        })
+
+    async def post(self, request, pk):
+        # Writes stay on the sync path, in one thread for the whole transaction
+        view = views.PlaceDetailView()
+        view.setup(request, pk=pk)
+        return await sync_to_async(view.post)(request, pk)
@@ -0,0 +1,220 @@
+import random
+import statistics
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+from uuid import uuid4
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import AsyncClient
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from .models import Place
+from reviews.models import Review
+from users.otp import get_otp_store
+
+# Per-view query budgets and latency measurements.
+# Shared by the benchmark_views command (large seeded datasets, JSON report)
+# and the QueryBudgetTests in tests.py (small dataset, fails on regressions).
+# The same scenarios run against the WSGI path (Client, sync views) or the
+# ASGI path (AsyncClient, the async views routed by citymate.asgi_urls).
+
+User = get_user_model()
+ASGI_URLCONF = 'citymate.asgi_urls'
+ASGI_VIEWS = ('home', 'search', 'search_by_distance', 'place_detail')  # the pages with async views
+
+
+@dataclass
+class Scenario:
+    name: str
+    budget: int  # most SQL queries one request may run
+    request: Callable  # (client, fixtures, prepared) -> response
+    prepare: Optional[Callable] = None  # (fixtures, iteration) -> prepared, runs outside the timer
+    login: bool = True
+    results: dict = field(default_factory=dict)
+
+
+def home(client, fixtures, prepared):
+    return client.get(reverse('home'), {'lat': fixtures['lat'], 'lon': fixtures['lon']})
+
+
+def search(client, fixtures, prepared):
+    return client.get(reverse('search'), {'q': fixtures['query']})
+
+
+def search_by_distance(client, fixtures, prepared):
+    return client.get(reverse('search'), {'sort': 'distance', 'max_km': 5, 'lat': fixtures['lat'], 'lon': fixtures['lon']})
+
+
+def search_api(client, fixtures, prepared):
+    return client.get(reverse('api_search'), {'q': fixtures['query']})
+
+
+def place_detail(client, fixtures, prepared):
+    return client.get(reverse('place_detail', args=[fixtures['popular_place_id']]))
+
+
+def profile(client, fixtures, prepared):
+    return client.get(reverse('profile'))
+
+
+def client_ip():
+    # A new client every time, so the per-IP rate limit doesn't turn the run into 429s
+    return '10.{}.{}.{}'.format(*uuid4().bytes[:3])
+
+
+def signup(client, fixtures, prepared):
+    return client.post(reverse('signup'), {
+        'email': f'bench-{uuid4().hex}@example.com', 'password': 'benchpass',
+        'age': 21, 'preferred_city': 'Coimbatore', 'user_type': 'student',
+    }, REMOTE_ADDR=client_ip())
+
+
+def prepare_verify(fixtures, iteration):
+    user = User.objects.create_user(username=f'verify-{uuid4().hex}', email=f'verify-{uuid4().hex}@example.com')
+    return {'code': get_otp_store().issue(user, 'email'), 'email_or_phone': user.email}
+
+
+def verify(client, fixtures, prepared):
+    return client.post(reverse('verify'), prepared, REMOTE_ADDR=client_ip())
+
+
+def scenarios():
+    return [
+        Scenario('home', 6, home),
+        Scenario('search', 5, search),
+        Scenario('search_by_distance', 8, search_by_distance),
+        Scenario('search_api', 6, search_api),
+        Scenario('place_detail', 5, place_detail),
+        Scenario('profile', 3, profile),
+        Scenario('signup', 4, signup, login=False),
+        Scenario('verify', 14, verify, prepare=prepare_verify, login=False),
+    ]
+
+
+def percentile(values, pct):
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[pct - 1]
+
+
+async def timed_async_request(scenario, client, fixtures, prepared):
+    start = time.perf_counter()
+    response = await scenario.request(client, fixtures, prepared)
+    return response, time.perf_counter() - start
+
+
+def timed_request(scenario, client, fixtures, prepared):
+    """(response, seconds) for one request."""
+    if isinstance(client, AsyncClient):
+        # Timed inside the event loop, so starting the loop isn't counted;
+        # the ORM calls it makes come back to this thread and its connection
+        return async_to_sync(timed_async_request)(scenario, client, fixtures, prepared)
+    start = time.perf_counter()
+    response = scenario.request(client, fixtures, prepared)
+    return response, time.perf_counter() - start
+
+
+def run_scenario(client, scenario, fixtures, iterations):
+    """Run one scenario `iterations` times and return its measurements."""
+    timings, query_counts, sql_times, failures = [], [], [], []
+    for iteration in range(iterations):
+        prepared = scenario.prepare(fixtures, iteration) if scenario.prepare else None
+        with CaptureQueriesContext(connection) as queries:
+            response, elapsed = timed_request(scenario, client, fixtures, prepared)
+        if response.status_code >= 400:
+            failures.append(response.status_code)
+            continue
+        timings.append(elapsed * 1000)
+        query_counts.append(len(queries.captured_queries))
+        sql_times.append(sum(float(query['time']) for query in queries.captured_queries) * 1000)
+
+    scenario.results = {
+        'view': scenario.name,
+        'budget': scenario.budget,
+        'requests': len(timings),
+        'failed_statuses': failures,
+        'queries': max(query_counts, default=0),
+        'sql_ms': round(statistics.mean(sql_times), 3) if sql_times else None,
+        'p50_ms': round(percentile(timings, 50), 3) if timings else None,
+        'p95_ms': round(percentile(timings, 95), 3) if timings else None,
+    }
+    scenario.results['over_budget'] = scenario.results['queries'] > scenario.budget
+    return scenario.results
+
+
+def run_all(client_class, fixtures, iterations=20, names=None, urlconf=None):
+    results = []
+    with override_settings(**({'ROOT_URLCONF': urlconf} if urlconf else {})):
+        for scenario in scenarios():
+            if names and scenario.name not in names:
+                continue
+            # Errors are recorded per scenario instead of aborting the whole run
+            client = client_class(raise_request_exception=False)
+            if scenario.login:
+                client.force_login(fixtures['user'])
+            # One warm-up request so caches and lazy imports don't skew p95
+            if not scenario.prepare:
+                timed_request(scenario, client, fixtures, None)
+            results.append(run_scenario(client, scenario, fixtures, iterations))
+    return results
+
+
+def run_asgi(fixtures, iterations=20, names=None):
+    """run_all() over the async views, as served under ASGI."""
+    names = [name for name in ASGI_VIEWS if not names or name in names]
+    return run_all(AsyncClient, fixtures, iterations, names, urlconf=ASGI_URLCONF)
+
+
+def compare(wsgi_results, asgi_results):
+    """Side by side numbers for each view measured on both paths."""
+    wsgi = {result['view']: result for result in wsgi_results}
+    rows = []
+    for result in asgi_results:
+        if result['view'] not in wsgi:
+            continue
+        rows.append({
+            'view': result['view'],
+            **{f'wsgi_{key}': wsgi[result['view']][key] for key in ('queries', 'p50_ms', 'p95_ms')},
+            **{f'asgi_{key}': result[key] for key in ('queries', 'p50_ms', 'p95_ms')},
+        })
+    return rows
+
+
+def seed(places=1000, users=200, reviews_per_place=5, seed_value=42):
+    """Bulk-load a synthetic dataset and return the fixtures the scenarios need."""
+    rng = random.Random(seed_value)
+    center_lat, center_lon = 11.0168, 76.9558
+    user_objs = User.objects.bulk_create(
+        [User(username=f'bench-user-{uuid4().hex[:12]}') for _ in range(users)], batch_size=1000,
+    )
+    place_objs = Place.objects.bulk_create([
+        Place(
+            name=f'Bench Place {i}', type=rng.choice(['food', 'stay']), sub_type='mess',
+            address=f'{i} Bench Road, Coimbatore', latitude=center_lat + rng.uniform(-0.2, 0.2),
+            longitude=center_lon + rng.uniform(-0.2, 0.2), price_level='average',
+            description='Benchmark place', tags='bench, test', is_approved=True,
+        )
+        for i in range(places)
+    ], batch_size=1000)
+    reviews = [
+        Review(place=place, user=rng.choice(user_objs), rating=rng.randint(1, 5), comment='Benchmark review')
+        for place in place_objs
+        for _ in range(reviews_per_place)
+    ]
+    # The first place is the "popular" one whose detail page we hit
+    reviews += [
+        Review(place=place_objs[0], user=rng.choice(user_objs), rating=5, comment='Popular')
+        for _ in range(reviews_per_place * 20)
+    ]
+    Review.objects.bulk_create(reviews, batch_size=2000)
+    return {
+        'user': user_objs[0],
+        'popular_place_id': place_objs[0].pk,
+        'query': 'bench',
+        'lat': center_lat,
+        'lon': center_lon,
+    }
@@ -0,0 +1,117 @@
+import hashlib
+
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.views.decorators.http import condition
+
+from . import feeds
+from citymate.db import on_replica
+from .models import Place
+
+# Conditional GET (ETag / Last-Modified) for place pages and listings.
+# A place page is validated by Place.version/updated_at, read with one
+# narrow query and no reviews; search and the JSON listings by the
+# 'listings' version in feeds.py, which every place edit, review write and
+# favorite bumps. Responses differ per user (favorites, CSRF token in
+# forms), so the user and their CSRF cookie are part of every ETag.
+# The async views read the validators up front with the async APIs and
+# leave them on the request, where the same etag functions find them.
+# Listings read from a replica get no ETag while the 'listings' version is
+# settling: the replica may predate the write, and a stale page must not be
+# tagged as current. Nor do they get one when the cache is local to each
+# process (see LISTING_ETAGS): a worker that didn't handle a write would
+# never see its version bump and keep answering 304.
+
+
+def make_etag(request, *parts):
+    parts = (
+        request.user.pk,
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+        *parts,
+    )
+    return hashlib.sha1('|'.join(map(str, parts)).encode()).hexdigest()
+
+
+def place_marker(request, pk):
+    """(version, updated_at) of place `pk`, or None; read once per request."""
+    if not hasattr(request, '_place_marker'):
+        request._place_marker = Place.objects.filter(pk=pk).values_list('version', 'updated_at').first()
+    return request._place_marker
+
+
+async def aplace_marker(request, pk):
+    if not hasattr(request, '_place_marker'):
+        request._place_marker = await Place.objects.filter(pk=pk).values_list('version', 'updated_at').afirst()
+    return request._place_marker
+
+
+def place_etag(request, pk):
+    marker = place_marker(request, pk)
+    if marker is None:
+        return None  # let the view answer 404
+    version, updated_at = marker
+    return make_etag(request, 'place', pk, version, updated_at.timestamp())
+
+
+def place_last_modified(request, pk):
+    marker = place_marker(request, pk)
+    return marker[1] if marker else None
+
+
+def listings_version(request):
+    if not hasattr(request, '_listings_version'):
+        request._listings_version = feeds.feed_version('listings')
+        request._listings_settling = feeds.settling('listings')
+    return request._listings_version
+
+
+async def alistings_version(request):
+    if not hasattr(request, '_listings_version'):
+        request._listings_version = await feeds.afeed_version('listings')
+        request._listings_settling = await feeds.asettling('listings')
+    return request._listings_version
+
+
+def listing_etags_enabled():
+    if settings.LISTING_ETAGS is not None:
+        return settings.LISTING_ETAGS
+    return not isinstance(caches['default'], LocMemCache)
+
+
+def listing_etag(request, *args, **kwargs):
+    if not listing_etags_enabled():
+        return None
+    version = listings_version(request)
+    if request._listings_settling and on_replica():
+        return None
+    # Distance sorting falls back to the location remembered in the session
+    location = request.session.get('location')
+    return make_etag(request, 'listings', version, request.get_full_path(), location)
+
+
+place_condition = condition(etag_func=place_etag, last_modified_func=place_last_modified)
+listing_condition = condition(etag_func=listing_etag)
+
+
+def async_place_condition(view):
+    conditional = place_condition(view)
+
+    @wraps(view)
+    async def inner(request, pk, *args, **kwargs):
+        await aplace_marker(request, pk)
+        return await conditional(request, pk, *args, **kwargs)
+    return inner
+
+
+def async_listing_condition(view):
+    conditional = listing_condition(view)
+
+    @wraps(view)
+    async def inner(request, *args, **kwargs):
+        if listing_etags_enabled():
+            await alistings_version(request)
+        return await conditional(request, *args, **kwargs)
+    return inner
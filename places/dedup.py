@@ -0,0 +1,131 @@
+import re
+import unicodedata
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from . import geo
+from .models import Place
+from reviews.models import Review
+from Recommenders.models import StalePlace
+
+# Near-duplicate place detection.
+# Two places are candidates when they are within DUPLICATE_RADIUS_KM of
+# each other and their names share enough character trigrams ("Sri
+# Annapoorna Mess" / "Annapoorna Mess"). Only places in the same or an
+# adjacent geohash cell are ever compared, so a batch run costs about one
+# comparison per place and neighbour instead of one per pair of places.
+
+WORD_RE = re.compile(r'\w+')
+
+
+def normalize_name(name):
+    """'Sri Annapoorna  Mess!' -> 'sri annapoorna mess', accents dropped."""
+    text = unicodedata.normalize('NFKD', name.casefold())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(WORD_RE.findall(text))
+
+
+def trigrams(name):
+    """Character trigrams of each word, padded like pg_trgm so short words still count."""
+    grams = set()
+    for word in normalize_name(name).split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a, b):
+    """Jaccard similarity of two trigram sets, 0..1."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def similar_places(name, lat, lon, exclude_pk=None):
+    """
+    [(place, score)] for places near (lat, lon) whose name looks like
+    `name`, best match first. Used to warn before a new place is saved.
+    """
+    grams = trigrams(name)
+    candidates = Place.objects.within(lat, lon, settings.DUPLICATE_RADIUS_KM)
+    if exclude_pk is not None:
+        candidates = candidates.exclude(pk=exclude_pk)
+    matches = []
+    for place in candidates.only('id', 'name', 'address', 'latitude', 'longitude'):
+        if geo.haversine_km(lat, lon, place.latitude, place.longitude) > settings.DUPLICATE_RADIUS_KM:
+            continue
+        score = similarity(grams, trigrams(place.name))
+        if score >= settings.DUPLICATE_MIN_SIMILARITY:
+            matches.append((place, score))
+    return sorted(matches, key=lambda match: (-match[1], match[0].pk))
+
+
+def candidate_pairs(queryset=None, radius_km=None, min_similarity=None):
+    """
+    Every pair of likely duplicates in `queryset` (all places by default),
+    as (score, distance_km, place_id, other_id) with place_id < other_id,
+    best first.
+    """
+    radius_km = settings.DUPLICATE_RADIUS_KM if radius_km is None else radius_km
+    min_similarity = settings.DUPLICATE_MIN_SIMILARITY if min_similarity is None else min_similarity
+    rows = list((Place.objects.all() if queryset is None else queryset).values_list('id', 'name', 'latitude', 'longitude'))
+    if not rows:
+        return []
+    # Cells must be at least radius_km wide everywhere, which is hardest
+    # where longitude degrees are shortest: the highest latitude present
+    precision = geo.precision_for_radius(radius_km, max(abs(row[2]) for row in rows))
+    cells = defaultdict(list)
+    grams = {}
+    for pk, name, lat, lon in rows:
+        cells[geo.encode(lat, lon, precision)].append((pk, lat, lon))
+        grams[pk] = trigrams(name)
+
+    pairs = []
+    for pk, name, lat, lon in rows:
+        for cell in geo.neighbour_cells(lat, lon, precision):
+            for other, other_lat, other_lon in cells.get(cell, ()):
+                if other <= pk:
+                    continue
+                distance_km = geo.haversine_km(lat, lon, other_lat, other_lon)
+                if distance_km > radius_km:
+                    continue
+                score = similarity(grams[pk], grams[other])
+                if score >= min_similarity:
+                    pairs.append((score, distance_km, pk, other))
+    pairs.sort(key=lambda pair: (-pair[0], pair[1], pair[2], pair[3]))
+    return pairs
+
+
+def pick_survivor(places):
+    """The copy to keep: the most reviewed, then approved, then the oldest."""
+    return min(places, key=lambda place: (-place.review_count, not place.is_approved, place.pk))
+
+
+def merge_places(survivor, duplicates):
+    """
+    Fold `duplicates` into `survivor`: their reviews, favorites and tags
+    move over, the survivor's rating is recomputed from the combined
+    reviews and the duplicates are deleted.
+    """
+    duplicate_ids = [place.pk for place in duplicates if place.pk != survivor.pk]
+    if not duplicate_ids:
+        return 0
+    with transaction.atomic():
+        # update() skips the per-review rating receivers; one recompute covers them all
+        Review.objects.filter(place_id__in=duplicate_ids).update(place=survivor)
+        user_ids = set(Place.favorites.through.objects.filter(place_id__in=duplicate_ids).values_list('user_id', flat=True))
+        if user_ids:
+            survivor.favorites.add(*user_ids)
+        tags = survivor.get_tags_list()
+        for place in Place.objects.filter(pk__in=duplicate_ids).only('id', 'tags'):
+            tags += place.get_tags_list()
+        survivor.set_tags(tags)
+        Place.objects.filter(pk=survivor.pk).recompute_ratings()
+        StalePlace.mark([survivor.pk])
+        # delete() one by one so the search index and feeds hear about it
+        for place in Place.objects.filter(pk__in=duplicate_ids):
+            place.delete()
+    survivor.refresh_from_db()
+    return len(duplicate_ids)
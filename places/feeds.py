@@ -0,0 +1,192 @@
+import random
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max, Min
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.dispatch import receiver
+
+from . import geo
+from citymate.db import reading_from_primary
+from .models import Place, alist, rank_by_distance
+
+# Precomputed home page feeds.
+# Each feed is cached under a versioned key; writes bump the version instead
+# of hunting down every key, so invalidating "all nearby buckets" is one
+# cache operation and stale entries simply age out with their TTL.
+# The a*() functions are the same feeds for the async views: they read the
+# cache and the database with the async APIs, so the home page can await
+# all three at once.
+# Feeds are built from the primary even under @replica_reads: a replica
+# that has not caught up with the write behind a new version would cache
+# pre-write rows under it for FEED_CACHE_TTL.
+
+# 'listings' caches nothing itself; its version is the validator for
+# conditional GETs on search and the JSON listings (see conditional.py)
+FEEDS = ('trending', 'nearby', 'recommendations', 'listings')
+# Everything a review write can change: every card shows average_rating
+RATING_FEEDS = ('trending', 'nearby', 'recommendations', 'listings')
+NEARBY_BUCKET_PRECISION = 6  # ~1.2km x 0.6km cells share one cached list
+FEED_SIZE = 10
+
+
+def initial_version():
+    # Seeded from the clock rather than 1, so a flushed cache never hands
+    # out a version (or ETag) that was already used for older data
+    return time.time_ns() // 1000
+
+
+def feed_version(feed):
+    return cache.get_or_set(f'feeds:{feed}:version', initial_version, timeout=None)
+
+
+async def afeed_version(feed):
+    return await cache.aget_or_set(f'feeds:{feed}:version', initial_version, timeout=None)
+
+
+def invalidate(*feeds):
+    feeds = feeds or FEEDS
+    for feed in feeds:
+        key = f'feeds:{feed}:version'
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, initial_version(), timeout=None)
+    cache.set_many({f'feeds:{feed}:settling': True for feed in feeds}, settings.READ_YOUR_WRITES_SECONDS)
+
+
+def settling(feed):
+    """Whether `feed` changed so recently that replicas may not have caught up yet."""
+    return cache.get(f'feeds:{feed}:settling', False)
+
+
+async def asettling(feed):
+    return await cache.aget(f'feeds:{feed}:settling', False)
+
+
+def cached_feed(feed, suffix, build):
+    key = f'feeds:{feed}:{feed_version(feed)}:{suffix}'
+    places = cache.get(key)
+    if places is None:
+        with reading_from_primary():
+            places = list(build())
+        cache.set(key, places, settings.FEED_CACHE_TTL)
+    return places
+
+
+async def acached_feed(feed, suffix, build):
+    # `build` returns an awaitable list
+    key = f'feeds:{feed}:{await afeed_version(feed)}:{suffix}'
+    places = await cache.aget(key)
+    if places is None:
+        # Tasks and sync_to_async() calls started by build() inherit the alias
+        with reading_from_primary():
+            places = await build()
+        await cache.aset(key, places, settings.FEED_CACHE_TTL)
+    return places
+
+
+def approved_places():
+    return Place.objects.filter(is_approved=True)
+
+
+def trending_places():
+    return approved_places().order_by('-average_rating', '-review_count')[:FEED_SIZE]
+
+
+def trending():
+    return cached_feed('trending', 'all', trending_places)
+
+
+async def atrending():
+    return await acached_feed('trending', 'all', lambda: alist(trending_places()))
+
+
+def nearby_bucket(lat, lon):
+    # Users in the same small cell get the same list, ranked from its centre;
+    # the few cached rows are re-ranked from the user's own position on read
+    cell = geo.encode(lat, lon, NEARBY_BUCKET_PRECISION)
+    return cell, geo.cell_center(cell)
+
+
+def nearby(lat, lon):
+    cell, (center_lat, center_lon) = nearby_bucket(lat, lon)
+    places = cached_feed('nearby', cell, lambda: approved_places().nearby(
+        center_lat, center_lon, settings.NEARBY_RADIUS_KM, k=FEED_SIZE,
+    ))
+    return rank_by_distance(places, lat, lon)
+
+
+async def anearby(lat, lon):
+    cell, (center_lat, center_lon) = nearby_bucket(lat, lon)
+    radius_km = settings.NEARBY_RADIUS_KM
+
+    async def build():
+        candidates = await alist(approved_places().within(center_lat, center_lon, radius_km))
+        return rank_by_distance(candidates, center_lat, center_lon, max_km=radius_km)[:FEED_SIZE]
+    return rank_by_distance(await acached_feed('nearby', cell, build), lat, lon)
+
+
+def recommendations_suffix(user, lat, lon):
+    # Personal lists are cached per user and location bucket; rebuilding the
+    # neighbor table or any place write bumps the shared version
+    cell = geo.encode(lat, lon, NEARBY_BUCKET_PRECISION)
+    user_key = user.pk if user.is_authenticated else 'anonymous'
+    return f'{user_key}:{cell}'
+
+
+def recommendations(user, lat, lon):
+    from Recommenders.engine import recommend
+    return cached_feed('recommendations', recommendations_suffix(user, lat, lon), lambda: recommend(user, lat, lon, k=FEED_SIZE))
+
+
+async def arecommendations(user, lat, lon):
+    from Recommenders.engine import recommend
+    # The engine is sync and runs several dependent queries, so a cache
+    # miss hands the whole build to one sync_to_async() call
+    return await acached_feed('recommendations', recommendations_suffix(user, lat, lon),
+                              lambda: sync_to_async(recommend)(user, lat, lon, k=FEED_SIZE))
+
+
+def random_sample(queryset, k, windows=3):
+    """
+    Roughly uniform random sample without ORDER BY RANDOM().
+
+    Picks a few random points in the id range and reads a short run of rows
+    from each through the primary key index, then samples from that pool.
+    """
+    # MIN/MAX over the bare primary key are answered straight from the index
+    bounds = queryset.model.objects.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return []
+    pool = {}
+    for _ in range(windows):
+        start = random.randint(bounds['low'], bounds['high'])
+        for place in queryset.filter(id__gte=start).order_by('id')[:k]:
+            pool[place.id] = place
+    if len(pool) < k:
+        # Windows landed near the top of the range; wrap around to the start
+        for place in queryset.order_by('id')[:k]:
+            pool[place.id] = place
+    return random.sample(list(pool.values()), min(k, len(pool)))
+
+
+@receiver(post_save, sender=Place)
+@receiver(post_delete, sender=Place)
+def invalidate_place_feeds(sender, **kwargs):
+    invalidate()
+
+
+@receiver(post_save, sender='reviews.Review')
+@receiver(post_delete, sender='reviews.Review')
+def invalidate_rating_feeds(sender, **kwargs):
+    invalidate(*RATING_FEEDS)
+
+
+@receiver(m2m_changed, sender=Place.favorites.through)
+def invalidate_favorite_listings(sender, action, **kwargs):
+    # Listings carry favorites_count and is_favorited
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate('listings')
@@ -1,5 +1,5 @@
 from django import forms
-from .models import Place
+from .models import Place, Tag
 
 class AddPlaceForm(forms.ModelForm):
     photo = forms.ImageField(required=False) 
@@ -24,3 +24,11 @@ class AddPlaceForm(forms.ModelForm):
             'contact_info': forms.TextInput(attrs={'class': 'form-control'}),
             'tags': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'e.g., cozy, late-night, wifi'}),
         }
+
+    def clean_tags(self):
+        return ', '.join(Tag.normalize_list(self.cleaned_data.get('tags', '')))
+
+    def _save_m2m(self):
+        # Runs on save() and on save_m2m() after save(commit=False)
+        super()._save_m2m()
+        self.instance.set_tags(self.cleaned_data.get('tags', ''))
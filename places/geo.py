@@ -0,0 +1,148 @@
+import math
+
+import numpy as np
+
+# Geohash helpers used to keep a spatial index on Place.
+# Cells are stored as base32 strings so that every prefix of a hash is the
+# cell that contains it, which lets us turn "points in this cell" into a
+# plain range query on an indexed CharField.
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+GEOHASH_PRECISION = 9  # ~4.8m x 4.8m, more than enough for a storefront
+
+
+class InvalidLocation(ValueError):
+    pass
+
+
+def check_point(lat, lon):
+    """Raise InvalidLocation unless (lat, lon) is a finite point on the globe."""
+    if not (math.isfinite(lat) and math.isfinite(lon)) or abs(lat) > 90 or abs(lon) > 180:
+        raise InvalidLocation('lat must be within [-90, 90] and lon within [-180, 180]')
+
+
+def check_radius(radius_km, name='radius_km'):
+    if not math.isfinite(radius_km):
+        raise InvalidLocation(f'{name} must be a finite number')
+
+
+def encode(lat, lon, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def cell_center(geohash):
+    """Return the (lat, lon) centre of a geohash cell."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if bits >> shift & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+
+
+def cell_size(precision):
+    """Return (lat_degrees, lon_degrees) covered by one cell at `precision`."""
+    total_bits = 5 * precision
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def precision_for_radius(radius_km, lat):
+    # Pick the finest precision whose cells are still at least `radius_km`
+    # on each side, so the 3x3 block around the centre covers the circle.
+    cos_lat = max(math.cos(math.radians(lat)), 0.01)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_deg, lon_deg = cell_size(precision)
+        if lat_deg * KM_PER_DEGREE >= radius_km and lon_deg * KM_PER_DEGREE * cos_lat >= radius_km:
+            return precision
+    return 1
+
+
+def covering_cells(lat, lon, radius_km):
+    """Geohash cells (centre + neighbours) that together cover the search circle."""
+    return neighbour_cells(lat, lon, precision_for_radius(radius_km, lat))
+
+
+def neighbour_cells(lat, lon, precision):
+    """The cell containing (lat, lon) at `precision` and the (up to) eight around it."""
+    lat_deg, lon_deg = cell_size(precision)
+    cells = set()
+    for dlat in (-lat_deg, 0, lat_deg):
+        cell_lat = lat + dlat
+        if cell_lat > 90 or cell_lat < -90:
+            continue
+        for dlon in (-lon_deg, 0, lon_deg):
+            cell_lon = (lon + dlon + 180) % 360 - 180
+            cells.add(encode(cell_lat, cell_lon, precision))
+    return sorted(cells)
+
+
+def bounding_box(lat, lon, radius_km):
+    """Return (min_lat, max_lat, min_lon, max_lon) around a point."""
+    dlat = radius_km / KM_PER_DEGREE
+    cos_lat = max(math.cos(math.radians(lat)), 0.01)
+    dlon = min(radius_km / (KM_PER_DEGREE * cos_lat), 180.0)
+    return lat - dlat, lat + dlat, lon - dlon, lon + dlon
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def haversine_km_many(lat, lon, lats, lons):
+    """Vectorised haversine from one point to arrays of points, in km."""
+    phi1 = np.radians(lat)
+    phi2 = np.radians(np.asarray(lats, dtype=np.float64))
+    dphi = phi2 - phi1
+    dlmb = np.radians(np.asarray(lons, dtype=np.float64) - lon)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def annotate_distances(places, lat, lon):
+    """Set `distance_km` on every place in one NumPy pass and return the array."""
+    places = list(places)
+    if not places:
+        return np.empty(0)
+    lats = np.fromiter((place.latitude for place in places), dtype=np.float64, count=len(places))
+    lons = np.fromiter((place.longitude for place in places), dtype=np.float64, count=len(places))
+    distances = haversine_km_many(lat, lon, lats, lons)
+    for place, distance_km in zip(places, distances.tolist()):
+        place.distance_km = distance_km
+    return distances
@@ -0,0 +1,103 @@
+import hashlib
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+# Place photo pipeline.
+# An upload is hashed, re-encoded without its EXIF block (after applying
+# the EXIF rotation) and cut into fixed-size variants, each written as WebP
+# and JPEG. Everything lives under a path derived from the content hash, so
+# an identical upload reuses the existing files and a URL never changes what
+# it points at: PHOTO_CACHE_CONTROL can mark it immutable.
+
+ROOT = 'place_photos'
+# name -> (width, height, crop). Cropped variants are exactly this size,
+# the others fit inside it.
+VARIANTS = {
+    'thumb': (160, 160, True),
+    'card': (560, 360, True),
+    'full': (1600, 1600, False),
+}
+FORMATS = {'webp': ('WEBP', {'quality': 80, 'method': 6}), 'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True})}
+
+
+def variant_path(digest, variant, fmt):
+    return f'{ROOT}/{digest[:2]}/{digest}/{variant}.{fmt}'
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def is_processed(digest):
+    # 'full.jpeg' is written last, so its presence means every variant exists
+    return default_storage.exists(variant_path(digest, 'full', 'jpeg'))
+
+
+def render(image, width, height, crop):
+    if crop:
+        return ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+    image = image.copy()
+    image.thumbnail((width, height), Image.Resampling.LANCZOS)
+    return image
+
+
+def encode(image, fmt):
+    pil_format, options = FORMATS[fmt]
+    buffer = BytesIO()
+    # No exif= argument, so none of the original metadata (GPS included) is written
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def process(data):
+    """Write every variant of the image in `data` unless it already exists. Returns the content hash."""
+    digest = content_hash(data)
+    if is_processed(digest):
+        return digest
+    with Image.open(BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original).convert('RGB')
+    for variant in sorted(VARIANTS, key=lambda name: name == 'full'):
+        rendered = render(image, *VARIANTS[variant])
+        for fmt in FORMATS:
+            path = variant_path(digest, variant, fmt)
+            if default_storage.exists(path):
+                default_storage.delete(path)  # left over from an interrupted run
+            default_storage.save(path, ContentFile(encode(rendered, fmt)))
+    return digest
+
+
+def attach_photo(place, upload):
+    """Process an uploaded file and point `place.photo` at its stripped full-size JPEG."""
+    data = b''.join(upload.chunks())
+    digest = process(data)
+    place.photo.name = variant_path(digest, 'full', 'jpeg')
+    place.photo_hash = digest
+    return digest
+
+
+def attach_processed(place, digest):
+    """Point `place` at an already processed photo, e.g. one kept across a form round-trip. False if there is none."""
+    if not (len(digest) == 64 and all(c in '0123456789abcdef' for c in digest) and is_processed(digest)):
+        return False
+    place.photo.name = variant_path(digest, 'full', 'jpeg')
+    place.photo_hash = digest
+    return True
+
+
+def variant_urls(digest):
+    """{'thumb': {'webp': url, 'jpeg': url}, 'card': {...}, 'full': {...}}"""
+    return {
+        variant: {fmt: default_storage.url(variant_path(digest, variant, fmt)) for fmt in FORMATS}
+        for variant in VARIANTS
+    }
+
+
+def cache_control(path):
+    """Cache-Control for a media path: variants are content-addressed and never change."""
+    if path.startswith(f'{ROOT}/') and path.count('/') == 3:
+        return settings.PHOTO_CACHE_CONTROL
+    return None
@@ -0,0 +1,175 @@
+import csv
+import io
+import json
+import os
+
+from django.db import DatabaseError, transaction
+
+from .forms import AddPlaceForm
+from .models import Place, PlaceTag, Tag
+
+# Bulk place import from CSV or JSON Lines.
+# Rows are read one at a time from the stream and written in chunks, so
+# memory stays flat however long the file is. Every row goes through
+# AddPlaceForm, the same rules as a place added on the site, and a row
+# whose name and coordinates match an existing place (or an earlier row)
+# is skipped. A bad row is reported and skipped; it never stops the import,
+# and that includes rows that aren't valid UTF-8.
+
+FORMATS = ('csv', 'jsonl')
+BAD_TEXT = '\ufffd'  # what undecodable bytes turn into
+
+
+def guess_format(name):
+    return 'jsonl' if os.path.splitext(name)[1].lower() in ('.jsonl', '.ndjson', '.json') else 'csv'
+
+
+def read_rows(stream, fmt):
+    """Yield (line number, row dict or None, error or None) from a text stream."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+    for line_no, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f'Invalid JSON: {e}'
+            continue
+        if not isinstance(row, dict):
+            yield line_no, None, 'Expected a JSON object'
+            continue
+        yield line_no, row, None
+
+
+def text_stream(binary):
+    """Decode an uploaded file or other binary stream as UTF-8 without reading it all in."""
+    # Bad bytes become BAD_TEXT, so only their rows fail instead of the whole file
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', errors='replace', newline='')
+
+
+def form_data(row):
+    data = {}
+    for key, value in row.items():
+        if key is None:
+            continue  # surplus CSV cells
+        if isinstance(value, list):
+            value = ', '.join(map(str, value))  # JSON tags may be a list
+        data[key.strip()] = '' if value is None else value
+    return data
+
+
+def dedup_key(name, lat, lon):
+    return (name.strip().casefold(), round(lat, 6), round(lon, 6))
+
+
+def format_errors(form):
+    return '; '.join(
+        f"{field}: {' '.join(messages)}" if field != '__all__' else ' '.join(messages)
+        for field, messages in form.errors.items()
+    )
+
+
+class ImportResult:
+    max_errors = 1000  # kept for the summary; every error still reaches on_error
+
+    def __init__(self):
+        self.created = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.errors = []  # [(line number, message)]
+
+    def as_dict(self):
+        return {'created': self.created, 'duplicates': self.duplicates, 'failed': self.failed,
+                'errors': [{'line': line, 'error': error} for line, error in self.errors]}
+
+
+class PlaceImporter:
+    def __init__(self, chunk_size=500, added_by=None, approve=False, on_error=None, progress=None):
+        self.chunk_size = chunk_size
+        self.added_by = added_by
+        self.approve = approve
+        self.on_error = on_error
+        self.progress = progress or (lambda result: None)
+
+    def error(self, result, line_no, message):
+        result.failed += 1
+        if len(result.errors) < result.max_errors:
+            result.errors.append((line_no, message))
+        if self.on_error:
+            self.on_error(line_no, message)
+
+    def run(self, stream, fmt='csv'):
+        result = ImportResult()
+        chunk = []
+        for line_no, row, error in read_rows(stream, fmt):
+            if error:
+                self.error(result, line_no, error)
+                continue
+            if any(BAD_TEXT in str(value) for value in row.values()):
+                self.error(result, line_no, 'Not valid UTF-8 text')
+                continue
+            form = AddPlaceForm(data=form_data(row))
+            if not form.is_valid():
+                self.error(result, line_no, format_errors(form))
+                continue
+            place = form.save(commit=False)
+            place.added_by = self.added_by
+            place.is_approved = self.approve
+            place.update_geohash()
+            chunk.append((line_no, place, form.cleaned_data['tags']))
+            if len(chunk) >= self.chunk_size:
+                self.write(chunk, result)
+                chunk = []
+        if chunk:
+            self.write(chunk, result)
+        return result
+
+    def existing_keys(self, places):
+        # Same coordinates give the same full-precision geohash, so the indexed
+        # geohash column finds every candidate in one query
+        hashes = {place.geohash for place in places}
+        return {
+            dedup_key(name, lat, lon)
+            for name, lat, lon in Place.objects.filter(geohash__in=hashes).values_list('name', 'latitude', 'longitude')
+        }
+
+    def write(self, chunk, result):
+        seen = self.existing_keys([place for _, place, _ in chunk])
+        rows = []
+        for line_no, place, tags in chunk:
+            key = dedup_key(place.name, place.latitude, place.longitude)
+            if key in seen:
+                result.duplicates += 1
+                continue
+            seen.add(key)
+            rows.append((line_no, place, tags))
+        if not rows:
+            return
+        try:
+            with transaction.atomic():
+                # bulk_create() also indexes the places for search and bumps the feeds
+                created = Place.objects.bulk_create([place for _, place, _ in rows])
+                self.write_tags(created, [tags for _, _, tags in rows])
+        except DatabaseError as e:
+            for line_no, _, _ in rows:
+                self.error(result, line_no, f'Not saved: {e}')
+            return
+        result.created += len(created)
+        self.progress(result)
+
+    def write_tags(self, places, tag_strings):
+        names_per_place = [Tag.normalize_list(tags) for tags in tag_strings]
+        names = {name for names in names_per_place for name in names}
+        if not names:
+            return
+        Tag.objects.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+        tag_ids = dict(Tag.objects.filter(name__in=names).values_list('name', 'id'))
+        PlaceTag.objects.bulk_create([
+            PlaceTag(place_id=place.pk, tag_id=tag_ids[name])
+            for place, place_names in zip(places, names_per_place)
+            for name in place_names
+        ])
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from places.models import Place, PlaceTag, Tag
+
+
+class Command(BaseCommand):
+    help = 'Backfills the Tag/PlaceTag index from the comma-separated Place.tags strings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        places = Place.objects.exclude(tags='').only('id', 'tags').order_by('id')
+        total_links = 0
+        last_id = 0
+        while True:
+            chunk = list(places.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+            wanted = {place.id: Tag.normalize_list(place.tags) for place in chunk}
+            names = {name for tag_names in wanted.values() for name in tag_names}
+            with transaction.atomic():
+                Tag.objects.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+                tag_ids = dict(Tag.objects.filter(name__in=names).values_list('name', 'id'))
+                links = [
+                    PlaceTag(place_id=place_id, tag_id=tag_ids[name])
+                    for place_id, tag_names in wanted.items()
+                    for name in tag_names
+                ]
+                PlaceTag.objects.bulk_create(links, ignore_conflicts=True)
+            total_links += len(links)
+            self.stdout.write(f'Processed places up to id {last_id}...')
+        self.stdout.write(self.style.SUCCESS(f'Backfilled {total_links} place tags.'))
@@ -0,0 +1,71 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from places import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a throwaway test database and measures query count, SQL time and '
+        'p50/p95 latency for every main view. Fails if a view exceeds its query budget.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--places', type=int, default=1000, help='e.g. 1000, 100000 or 1000000')
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--reviews-per-place', type=int, default=5)
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--view', action='append', dest='views', help='Only run these views (repeatable).')
+        parser.add_argument('--output', default='bench_output.json')
+        parser.add_argument('--keepdb', action='store_true', help='Reuse the benchmark database between runs.')
+        parser.add_argument('--asgi', action='store_true', help='Also run the pages that have async views under ASGI and compare.')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            # Only 'default' is swapped for the test database: with replicas on,
+            # @replica_reads views would read the real data and their queries
+            # wouldn't be counted against the budgets
+            with override_settings(DATABASE_REPLICAS=[]):
+                self.stdout.write(f"Seeding {options['places']} places...")
+                fixtures = benchmarks.seed(options['places'], options['users'], options['reviews_per_place'])
+                results = benchmarks.run_all(Client, fixtures, options['iterations'], options['views'])
+                asgi_results = (
+                    benchmarks.run_asgi(fixtures, options['iterations'], options['views']) if options['asgi'] else []
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        report = {'places': options['places'], 'iterations': options['iterations'], 'results': results}
+        if options['asgi']:
+            report['asgi_results'] = asgi_results
+            report['asgi_comparison'] = benchmarks.compare(results, asgi_results)
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+
+        for result in results:
+            line = (
+                f"{result['view']:<20} queries={result['queries']:<3} (budget {result['budget']}) "
+                f"sql={result['sql_ms']}ms p50={result['p50_ms']}ms p95={result['p95_ms']}ms"
+            )
+            if result['failed_statuses']:
+                line += f" failed={sorted(set(result['failed_statuses']))}"
+            self.stdout.write(self.style.ERROR(line) if result['over_budget'] else line)
+        for row in report.get('asgi_comparison', []):
+            self.stdout.write(
+                f"{row['view']:<20} wsgi p50={row['wsgi_p50_ms']}ms p95={row['wsgi_p95_ms']}ms "
+                f"queries={row['wsgi_queries']} | asgi p50={row['asgi_p50_ms']}ms p95={row['asgi_p95_ms']}ms "
+                f"queries={row['asgi_queries']}"
+            )
+        self.stdout.write(f"Wrote {options['output']}")
+
+        over = [result['view'] for result in results if result['over_budget']]
+        over += [f"{result['view']} (asgi)" for result in asgi_results if result['over_budget']]
+        if over:
+            raise CommandError(f"Over query budget: {', '.join(over)}")
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from places import dedup
+from places.models import Place
+
+
+class Command(BaseCommand):
+    help = 'Lists pairs of places that look like the same place listed twice, best match first.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--radius-km', type=float, help='Defaults to DUPLICATE_RADIUS_KM.')
+        parser.add_argument('--min-similarity', type=float, help='Name similarity 0..1; defaults to DUPLICATE_MIN_SIMILARITY.')
+        parser.add_argument('--limit', type=int, default=0, help='Only print the best N pairs.')
+
+    def handle(self, *args, **options):
+        pairs = dedup.candidate_pairs(radius_km=options['radius_km'], min_similarity=options['min_similarity'])
+        if options['limit']:
+            pairs = pairs[:options['limit']]
+        ids = {pk for pair in pairs for pk in pair[2:]}
+        places = Place.objects.only('id', 'name', 'review_count', 'is_approved').in_bulk(ids)
+        self.stdout.write('score\tdistance_m\tkeep\tmerge\tkeep_name\tmerge_name')
+        for score, distance_km, pk, other in pairs:
+            keep = dedup.pick_survivor([places[pk], places[other]])
+            merge = places[other] if keep.pk == pk else places[pk]
+            self.stdout.write(f'{score:.2f}\t{distance_km * 1000:.0f}\t{keep.pk}\t{merge.pk}\t{keep.name}\t{merge.name}')
+        self.stdout.write(self.style.SUCCESS(f'{len(pairs)} merge candidates.'))
@@ -0,0 +1,45 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from places.importer import FORMATS, PlaceImporter, guess_format, text_stream
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Imports places from a CSV (header row of AddPlaceForm field names) or JSON Lines file. '
+        'Invalid rows and places that already exist are reported and skipped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for stdin.")
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension; csv for stdin.')
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--owner', help='Username recorded as added_by.')
+        parser.add_argument('--approve', action='store_true', help='Publish imported places straight away.')
+
+    def handle(self, *args, **options):
+        owner = None
+        if options['owner']:
+            try:
+                owner = User.objects.get(username=options['owner'])
+            except User.DoesNotExist:
+                raise CommandError(f"No user named {options['owner']}")
+        path = options['path']
+        fmt = options['format'] or ('csv' if path == '-' else guess_format(path))
+
+        importer = PlaceImporter(
+            chunk_size=options['chunk_size'], added_by=owner, approve=options['approve'],
+            on_error=lambda line, error: self.stderr.write(f'Line {line}: {error}'),
+            progress=lambda result: self.stdout.write(f'Imported {result.created} places...'),
+        )
+        if path == '-':
+            result = importer.run(text_stream(sys.stdin.buffer), fmt)
+        else:
+            with open(path, 'rb') as binary:
+                result = importer.run(text_stream(binary), fmt)
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {result.created} places, skipped {result.duplicates} duplicates, {result.failed} rows failed.'
+        ))
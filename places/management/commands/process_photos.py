@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+from django.utils import timezone
+from PIL import UnidentifiedImageError
+from places import feeds, images
+from places.models import Place
+
+
+class Command(BaseCommand):
+    help = 'Runs existing place photos through the thumbnail/WebP pipeline and points places at the stripped copy.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=200)
+        parser.add_argument('--delete-originals', action='store_true', help='Remove each original upload once processed.')
+
+    def handle(self, *args, **options):
+        # Seeded places store an external URL in `photo`; there is no file to process
+        places = (
+            Place.objects.filter(photo_hash='').exclude(Q(photo='') | Q(photo__isnull=True))
+            .exclude(photo__startswith='http').only('id', 'photo').order_by('id')
+        )
+        processed = failed = 0
+        last_id = 0
+        while True:
+            chunk = list(places.filter(id__gt=last_id)[:options['chunk_size']])
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+            for place in chunk:
+                original = place.photo.name
+                try:
+                    with place.photo.open('rb') as f:
+                        digest = images.process(f.read())
+                except (OSError, UnidentifiedImageError) as e:
+                    self.stderr.write(f'Place {place.id}: could not process {original}: {e}')
+                    failed += 1
+                    continue
+                # update() rather than save(): nothing searchable changed. The photo
+                # URL did, so the version moves on for ETags and the review fragment
+                Place.objects.filter(pk=place.pk).update(
+                    photo=images.variant_path(digest, 'full', 'jpeg'), photo_hash=digest,
+                    version=F('version') + 1, updated_at=timezone.now(),
+                )
+                if options['delete_originals'] and not Place.objects.filter(photo=original).exists():
+                    place.photo.storage.delete(original)
+                processed += 1
+            self.stdout.write(f'Processed places up to id {last_id}...')
+        if processed:
+            # Cached feeds hold whole places, old photo URL included
+            feeds.invalidate()
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} photos ({failed} failed).'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from places.models import Place
+
+
+class Command(BaseCommand):
+    help = 'Recomputes review_count, rating_sum and average_rating for every place from its reviews.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        def progress(label, done, total):
+            self.stdout.write(f'Recomputed {done} places...')
+
+        total = Place.objects.recompute_ratings_in_chunks(options['chunk_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f'Recomputed ratings for {total} places.'))
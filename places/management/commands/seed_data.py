@@ -3,13 +3,30 @@ from django.core.management.base import BaseCommand
 from places.models import Place
 from reviews.models import Review
 from django.contrib.auth import get_user_model
+from places.synthetic import SyntheticData, wipe
 
 User = get_user_model()
 
 class Command(BaseCommand):
-    help = 'Seeds the database with a rich set of dummy data for places and reviews.'
+    help = (
+        'Seeds the database with a rich set of dummy data for places and reviews. '
+        'Pass --places to generate a large synthetic dataset instead, e.g. '
+        '--places 100000 --users 20000 --reviews 1000000.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--places', type=int, default=0, help='Generate this many synthetic places.')
+        parser.add_argument('--users', type=int, default=0)
+        parser.add_argument('--reviews', type=int, default=0)
+        parser.add_argument('--favorites', type=int, default=0)
+        parser.add_argument('--seed', type=int, default=42, help='Same seed, same dataset.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--append', action='store_true', help='Keep existing data instead of clearing it first.')
 
     def handle(self, *args, **kwargs):
+        if kwargs['places']:
+            return self.seed_synthetic(kwargs)
+
         self.stdout.write(self.style.SUCCESS('Starting database seeding process...'))
 
         # --- User Setup ---
@@ -26,9 +43,10 @@ class Command(BaseCommand):
         owner_user = users[0]
 
         # --- Clear Existing Data ---
-        Review.objects.all().delete()
-        Place.objects.all().delete()
-        self.stdout.write(self.style.WARNING('Cleared existing place and review data.'))
+        if not kwargs['append']:
+            Review.objects.all().delete()
+            Place.objects.all().delete()
+            self.stdout.write(self.style.WARNING('Cleared existing place and review data.'))
 
         # --- Dummy Data Definitions ---
         places_data = [
@@ -65,6 +83,7 @@ class Command(BaseCommand):
                 average_rating=round(random.uniform(3.5, 5.0), 1),
                 added_by=owner_user
             )
+            place.set_tags(place_data['tags'])
             created_places.append(place)
         
         self.stdout.write(self.style.SUCCESS(f'Successfully added {len(created_places)} places.'))
@@ -95,4 +114,22 @@ class Command(BaseCommand):
             
         Review.objects.bulk_create(reviews_to_create)
         self.stdout.write(self.style.SUCCESS(f'Successfully added {len(reviews_to_create)} reviews.'))
-        self.stdout.write(self.style.SUCCESS('Database seeding complete!'))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS('Database seeding complete!'))
+
+    def seed_synthetic(self, options):
+        def progress(label, done, total):
+            self.stdout.write(f'  {label}: {done}' + (f'/{total}' if total else ''))
+
+        if not options['append']:
+            wipe()
+            self.stdout.write(self.style.WARNING('Cleared existing place and review data.'))
+        data = SyntheticData(seed=options['seed'], batch_size=options['batch_size'], progress=progress)
+        data.generate(
+            places=options['places'],
+            users=options['users'],
+            reviews=options['reviews'],
+            favorites=options['favorites'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Added {options['places']} places, {options['users']} users and {options['reviews']} reviews."
+        ))
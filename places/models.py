@@ -1,12 +1,196 @@
-from django.db import models
+import math
+
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
-from django.db.models import Avg
-from django.db.models.signals import post_save
+from django.db.models import Case, Count, ExpressionWrapper, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from geopy.distance import distance as geopy_distance
+from django.utils import timezone
+from . import geo, images
+from .search import FTS5SearchBackend, MatchField, get_search_backend
 
 User = get_user_model()
 
+
+def rank_by_distance(places, lat, lon, max_km=None):
+    """Sort places by distance from (lat, lon), optionally dropping those beyond `max_km`."""
+    places = list(places)
+    distances = geo.annotate_distances(places, lat, lon)
+    order = distances.argsort(kind='stable')
+    if max_km is not None:
+        order = order[distances[order] <= max_km]
+    return [places[i] for i in order.tolist()]
+
+
+# beyond() keeps everything its flat-earth estimate puts past this share of
+# the radius: the estimate is a few tenths of a percent off at 50km.
+RING_SLACK = 0.95
+
+
+def flat_offset(lat, lon):
+    """Squared flat-earth distance from (lat, lon) in degrees of latitude, as plain SQL arithmetic."""
+    dlat = F('latitude') - lat
+    dlon = (F('longitude') - lon) * math.cos(math.radians(lat))
+    return ExpressionWrapper(dlat * dlat + dlon * dlon, output_field=FloatField())
+
+
+async def alist(queryset):
+    """Evaluate `queryset` from async code, e.g. several at once under asyncio.gather()."""
+    return [item async for item in queryset]
+
+
+class PlaceQuerySet(models.QuerySet):
+    def for_listing(self):
+        """Everything PlaceSerializer needs for a list in a fixed number of queries."""
+        favorites = (
+            Place.favorites.through.objects.filter(place_id=OuterRef('pk'))
+            .order_by().values('place_id').annotate(count=Count('*')).values('count')
+        )
+        return self.select_related('added_by').annotate(
+            favorites_count=Coalesce(Subquery(favorites), 0),
+        )
+
+    def within(self, lat, lon, radius_km):
+        """
+        Candidates that may lie within `radius_km` of (lat, lon).
+
+        Uses the geohash cells covering the circle (an index range scan per
+        cell) plus a lat/lon bounding box. Corners of the box can still be
+        slightly too far away, so callers rank by exact distance afterwards.
+        """
+        cells = Q()
+        for cell in geo.covering_cells(lat, lon, radius_km):
+            cells |= Q(geohash__gte=cell, geohash__lt=cell + '{')
+        min_lat, max_lat, min_lon, max_lon = geo.bounding_box(lat, lon, radius_km)
+        candidates = self.filter(cells, latitude__range=(min_lat, max_lat))
+        if -180 <= min_lon and max_lon <= 180:
+            candidates = candidates.filter(longitude__range=(min_lon, max_lon))
+        return candidates
+
+    def beyond(self, lat, lon, radius_km):
+        """
+        Drop places that are surely closer than `radius_km` to (lat, lon).
+
+        Uses a flat-earth distance in plain arithmetic, so any database can
+        filter on it. Its error within NEARBY_MAX_RADIUS_KM stays well inside
+        RING_SLACK short of the poles, so places near the edge are kept and
+        callers rank by exact distance afterwards.
+        """
+        if radius_km <= 0:
+            return self
+        inner = radius_km * RING_SLACK / geo.KM_PER_DEGREE
+        return self.alias(ring_offset=flat_offset(lat, lon)).filter(ring_offset__gte=inner * inner)
+
+    def closer_than(self, lat, lon, radius_km):
+        """
+        Places within `radius_km` of (lat, lon) by the flat-earth distance
+        beyond() uses. It is filtered in SQL, so a keyset page cut from the
+        result is never short; places within a few metres of the edge may
+        fall either side of it.
+        """
+        outer = radius_km / geo.KM_PER_DEGREE
+        return self.alias(radius_offset=flat_offset(lat, lon)).filter(radius_offset__lte=outer * outer)
+
+    def nearby(self, lat, lon, radius_km=5, k=10):
+        """Up to `k` places within `radius_km` of (lat, lon), nearest first, with `distance_km` set."""
+        return rank_by_distance(self.within(lat, lon, radius_km), lat, lon, max_km=radius_km)[:k]
+
+    def with_tags(self, names, match='all'):
+        """
+        Places tagged with exactly these tag names.
+
+        match='all' keeps places that carry every tag, match='any' places that
+        carry at least one. Both run as a single subquery over PlaceTag.
+        """
+        names = Tag.normalize_list(names)
+        if not names:
+            return self
+        links = PlaceTag.objects.filter(tag__name__in=names).values('place_id')
+        if match == 'all':
+            links = links.annotate(matched=Count('tag_id')).filter(matched=len(names))
+        return self.filter(id__in=links.values('place_id'))
+
+    def tag_facets(self, limit=20):
+        """[(tag name, number of places)] across this queryset, most used first, in one grouped query."""
+        return list(self.tag_facet_query(limit))
+
+    def tag_facet_query(self, limit=20):
+        """The unevaluated query behind tag_facets()."""
+        counts = (
+            PlaceTag.objects.filter(place_id__in=self.order_by().values('id'))
+            .values_list('tag__name')
+            .annotate(count=Count('place_id'))
+            .order_by('-count', 'tag__name')
+        )
+        return counts[:limit]
+
+    def touch(self):
+        """Bump version/updated_at, e.g. after a change to something shown on the place page."""
+        return self.update(version=F('version') + 1, updated_at=timezone.now())
+
+    def apply_rating_delta(self, count_delta, sum_delta):
+        """Shift review_count/rating_sum by the deltas and recompute average_rating, in one UPDATE."""
+        new_count = F('review_count') + count_delta
+        new_sum = F('rating_sum') + sum_delta
+        return self.update(
+            version=F('version') + 1,
+            updated_at=timezone.now(),
+            review_count=new_count,
+            rating_sum=new_sum,
+            average_rating=Case(
+                When(review_count__gt=-count_delta, then=Cast(new_sum, FloatField()) / new_count),
+                default=Value(0.0),
+                output_field=FloatField(),
+            ),
+        )
+
+    def recompute_ratings(self):
+        """Rebuild the rating totals of these places from their reviews, in one grouped query."""
+        places = list(
+            self.order_by()
+            .annotate(counted=Count('reviews'), summed=Coalesce(Sum('reviews__rating'), 0))
+            .only('id', 'version')
+        )
+        now = timezone.now()
+        for place in places:
+            place.review_count = place.counted
+            place.rating_sum = place.summed
+            place.average_rating = place.summed / place.counted if place.counted else 0.0
+            place.version += 1
+            place.updated_at = now
+        self.model.objects.bulk_update(
+            places, ['review_count', 'rating_sum', 'average_rating', 'version', 'updated_at'],
+        )
+        return len(places)
+
+    def recompute_ratings_in_chunks(self, chunk_size=1000, progress=None):
+        """recompute_ratings() over the whole queryset, one id-ordered chunk per transaction."""
+        ids = self.order_by('id').values_list('id', flat=True)
+        total = 0
+        last_id = 0
+        while True:
+            chunk = list(ids.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                return total
+            last_id = chunk[-1]
+            with transaction.atomic():
+                total += self.model.objects.filter(id__in=chunk).recompute_ratings()
+            if progress:
+                progress('ratings', total, None)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create skips save(), so fill in the spatial index here
+        objs = list(objs)
+        for obj in objs:
+            obj.update_geohash()
+        created = super().bulk_create(objs, *args, **kwargs)
+        get_search_backend().index(created)
+        from .feeds import invalidate
+        invalidate()
+        return created
+
+
 class Place(models.Model):
     TYPE_CHOICES = (('food', 'Food'), ('stay', 'Stay'))
     SUB_TYPE_CHOICES = (('mess', 'Mess'), ('bakery', 'Bakery'), ('stall', 'Stall'), ('hotel', 'Hotel'), ('pg', 'PG'), ('hostel', 'Hostel'), ('rental', 'Rental'))
@@ -25,30 +209,184 @@ class Place(models.Model):
     # CHANGED: Switched from JSONField to ImageField for a single photo
     # As of now single photo is allowed for Simplicity
     photo = models.ImageField(upload_to='place_photos/', null=True, blank=True)
+    # Content hash of the processed photo; its variants live under this hash (see images.py)
+    photo_hash = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
     
     tags = models.CharField(max_length=255, blank=True, help_text="Comma-separated tags, e.g., cozy, late-night, wifi")
 
     added_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='added_places')
     is_approved = models.BooleanField(default=False)
     average_rating = models.FloatField(default=0.0)
+    # Running totals behind average_rating, maintained incrementally on review writes
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
     favorites = models.ManyToManyField(User, related_name='favorite_places', blank=True)
+    # Normalised copy of `tags`, used for exact filtering and facet counts
+    tag_set = models.ManyToManyField('Tag', through='PlaceTag', related_name='places', blank=True)
     reported = models.BooleanField(default=False)
+    # Spatial index, kept in sync with latitude/longitude on save
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
+    # Bumped by every place edit and review write; the validators for conditional GETs
+    version = models.PositiveIntegerField(default=1, editable=False)
+    updated_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    objects = PlaceQuerySet.as_manager()
+
+    class Meta:
+        # Partial indexes for the moderation queues: each holds only the few
+        # rows waiting for a decision, in the order the queue pages them
+        indexes = [
+            models.Index(fields=['id'], condition=Q(is_approved=False), name='place_pending_idx'),
+            models.Index(fields=['id'], condition=Q(reported=True), name='place_reported_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.sub_type})"
 
+    def update_geohash(self):
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = geo.encode(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+
+    def save(self, *args, **kwargs):
+        self.update_geohash()
+        if self.pk is not None:
+            self.version += 1
+        self.updated_at = timezone.now()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields) | {'version', 'updated_at'}
+            if {'latitude', 'longitude'} & update_fields:
+                update_fields.add('geohash')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
     def get_tags_list(self):
         return [tag.strip() for tag in self.tags.split(',') if tag.strip()]
 
+    def set_tags(self, tags):
+        """
+        Replace this place's tags. Accepts a comma-separated string or a list.
+
+        Writes the PlaceTag links and keeps the `tags` display string in step.
+        """
+        names = Tag.normalize_list(tags)
+        existing = {tag.name: tag for tag in Tag.objects.filter(name__in=names)}
+        missing = [Tag(name=name) for name in names if name not in existing]
+        if missing:
+            Tag.objects.bulk_create(missing, ignore_conflicts=True)
+            existing = {tag.name: tag for tag in Tag.objects.filter(name__in=names)}
+        PlaceTag.objects.filter(place=self).exclude(tag__name__in=names).delete()
+        PlaceTag.objects.bulk_create(
+            [PlaceTag(place=self, tag=existing[name]) for name in names],
+            ignore_conflicts=True,
+        )
+        display = ', '.join(names)
+        if display != self.tags:
+            self.tags = display
+            self.save(update_fields=['tags'])
+
+    @property
+    def photo_variants(self):
+        """URLs of the processed photo variants, or None until the photo has been through images.py."""
+        return images.variant_urls(self.photo_hash) if self.photo_hash else None
+
     def calculate_distance(self, user_lat, user_lon):
-        if self.latitude and self.longitude and user_lat and user_lon:
-            return geopy_distance((self.latitude, self.longitude), (user_lat, user_lon)).km
+        # Single lookups only; use rank_by_distance/geo.annotate_distances for result sets
+        # 0.0 is a real latitude/longitude (the equator, Greenwich), only None is missing
+        if None not in (self.latitude, self.longitude, user_lat, user_lon):
+            return geo.haversine_km(self.latitude, self.longitude, user_lat, user_lon)
         return None
 
-# Signal to update average_rating when a review is saved
+class Tag(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+
+    def __str__(self):
+        return self.name
+
+    @staticmethod
+    def normalize(name):
+        return ' '.join(name.lower().split())[:50]
+
+    @classmethod
+    def normalize_list(cls, tags):
+        if isinstance(tags, str):
+            tags = tags.split(',')
+        names = []
+        for tag in tags:
+            name = cls.normalize(tag)
+            if name and name not in names:
+                names.append(name)
+        return names
+
+class PlaceTag(models.Model):
+    place = models.ForeignKey(Place, on_delete=models.CASCADE)
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
+
+    class Meta:
+        # (place, tag) serves per-place lookups, (tag, place) tag filters and facets
+        unique_together = ('place', 'tag')
+        indexes = [models.Index(fields=['tag', 'place'])]
+
+    def __str__(self):
+        return f"{self.place_id}:{self.tag_id}"
+
+class PlaceSearchEntry(models.Model):
+    """
+    A row of the FTS5 index (see search.py), so searches join it like any
+    other table. The virtual table is created by FTS5SearchBackend.setup(),
+    never by migrations, and written only through the backend.
+    """
+    place = models.OneToOneField(
+        Place, primary_key=True, db_column='rowid', db_constraint=False,
+        on_delete=models.DO_NOTHING, related_name='search_entry',
+    )
+    # FTS5's hidden columns: the one named after the table takes MATCH,
+    # rank is the configured bm25 score of the current match
+    document = MatchField(db_column=FTS5SearchBackend.table)
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = FTS5SearchBackend.table
+
+# Keep review_count/rating_sum/average_rating in step with reviews.
+# Every write is a single UPDATE with F() expressions, so the cost does not
+# grow with the number of reviews and concurrent writers cannot lose counts.
 @receiver(post_save, sender='reviews.Review')
-def update_place_rating(sender, instance, **kwargs):
-    place = instance.place
-    average = place.reviews.aggregate(Avg('rating'))['rating__avg']
-    place.average_rating = average or 0.0
-    place.save(update_fields=['average_rating'])
\ No newline at end of file
+def update_place_rating(sender, instance, created, **kwargs):
+    old_place_id, old_rating = instance._loaded_place_id, instance._loaded_rating
+    if created:
+        Place.objects.filter(pk=instance.place_id).apply_rating_delta(1, instance.rating)
+    elif old_place_id is None or old_rating is None:
+        # Loaded with only()/defer(), so we don't know the old values
+        Place.objects.filter(pk=instance.place_id).recompute_ratings()
+    elif old_place_id != instance.place_id:
+        Place.objects.filter(pk=old_place_id).apply_rating_delta(-1, -old_rating)
+        Place.objects.filter(pk=instance.place_id).apply_rating_delta(1, instance.rating)
+    elif old_rating != instance.rating:
+        Place.objects.filter(pk=instance.place_id).apply_rating_delta(0, instance.rating - old_rating)
+    else:
+        # Only the comment changed; the place page still shows it
+        Place.objects.filter(pk=instance.place_id).touch()
+
+@receiver(post_delete, sender='reviews.Review')
+def remove_place_rating(sender, instance, **kwargs):
+    if instance._loaded_place_id is None or instance._loaded_rating is None:
+        Place.objects.filter(pk=instance.place_id).recompute_ratings()
+    else:
+        Place.objects.filter(pk=instance._loaded_place_id).apply_rating_delta(-1, -instance._loaded_rating)
+
+SEARCH_FIELDS = {'name', 'description', 'tags'}
+
+# Keep the full-text index in sync with Place
+@receiver(post_save, sender=Place)
+def index_place(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not SEARCH_FIELDS & set(update_fields):
+        return
+    get_search_backend().index([instance])
+
+@receiver(post_delete, sender=Place)
+def unindex_place(sender, instance, **kwargs):
+    get_search_backend().remove([instance.pk])
@@ -0,0 +1,67 @@
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import feeds
+from .models import Place
+from .pagination import paginate_queryset
+from reviews.models import Review
+from Recommenders.models import PlaceNeighbor, StalePlace
+
+# Moderation queues.
+# New places wait in 'pending' until approved; approved places that users
+# report wait in 'reported'. Each queue filter matches a partial index in
+# Place.Meta, and pages are keyset-paged by id with no COUNT(*), so a page
+# costs the same however many rows are waiting or approved.
+
+QUEUES = {
+    'pending': Q(is_approved=False),
+    'reported': Q(reported=True),
+}
+ORDERING = ['id']  # oldest first
+
+
+def queue_page(queue, cursor=None, page_size=None):
+    """(places, next_cursor) for one page of `queue`. Raises InvalidCursor for a bad cursor."""
+    places = Place.objects.filter(QUEUES[queue]).select_related('added_by').only(
+        'id', 'name', 'type', 'sub_type', 'address', 'is_approved', 'reported', 'review_count',
+        'added_by__username', 'added_by__email',
+    )
+    return paginate_queryset(places, ORDERING, f'moderation-{queue}', cursor, page_size)
+
+
+def approve(place_ids):
+    """Publish these places and clear any report against them. Returns how many changed."""
+    with transaction.atomic():
+        changed = Place.objects.filter(Q(pk__in=place_ids), QUEUES['pending'] | QUEUES['reported']).update(
+            is_approved=True, reported=False, version=F('version') + 1, updated_at=timezone.now(),
+        )
+    if changed:
+        # update() skips post_save; newly visible places change every feed
+        feeds.invalidate()
+    return changed
+
+
+def reject(place_ids):
+    """
+    Delete these places along with their reviews, favorites and tags.
+    Returns how many were deleted.
+    """
+    place_ids = list(Place.objects.filter(Q(pk__in=place_ids), QUEUES['pending'] | QUEUES['reported']).values_list('id', flat=True))
+    if not place_ids:
+        return 0
+    with transaction.atomic():
+        # Places that list a rejected place as a neighbour need a new top-N
+        affected = set(
+            PlaceNeighbor.objects.filter(neighbor_id__in=place_ids).values_list('place_id', flat=True)
+        ) - set(place_ids)
+        # Reviews first: their delete receivers adjust ratings and mark the
+        # place stale, and those marks must exist before the places' own
+        # cascade collects them
+        Review.objects.filter(place_id__in=place_ids).delete()
+        # delete() rather than _raw_delete() so the search index and feeds hear about it
+        deleted = len(place_ids)
+        Place.objects.filter(pk__in=place_ids).delete()
+        if affected:
+            StalePlace.mark(affected)
+    return deleted
@@ -0,0 +1,157 @@
+import math
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+
+from .models import rank_by_distance
+
+# Keyset (cursor) pagination.
+# Instead of OFFSET, a page starts right after the sort key of the last row
+# on the previous page, so every page costs the same no matter how deep it
+# is. Cursors are signed so clients treat them as opaque and cannot tamper
+# with them.
+
+CURSOR_SALT = 'places.pagination'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(kind, key, **extra):
+    # Datetimes travel as ISO strings, which the field lookups parse back
+    key = [value.isoformat() if hasattr(value, 'isoformat') else value for value in key]
+    return signing.dumps({'o': kind, 'k': key, **extra}, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token, kind):
+    try:
+        data = signing.loads(token, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        raise InvalidCursor('Malformed cursor')
+    if data.get('o') != kind:
+        raise InvalidCursor('Cursor belongs to a different ordering')
+    return data
+
+
+def get_page_size(value):
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return settings.PLACES_PAGE_SIZE
+    return min(max(size, 1), settings.PLACES_MAX_PAGE_SIZE)
+
+
+def keyset_filter(queryset, ordering, key):
+    """Rows strictly after `key` in `ordering`, e.g. ['-average_rating', '-id']."""
+    after = Q()
+    equal = Q()
+    for field, value in zip(ordering, key):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        after |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    return queryset.filter(after)
+
+
+def keyset_page(queryset, ordering, kind, cursor, page_size):
+    """The unevaluated query for one page, plus one row that tells whether there is a next page."""
+    if cursor:
+        queryset = keyset_filter(queryset, ordering, decode_cursor(cursor, kind)['k'])
+    return queryset.order_by(*ordering)[:page_size + 1]
+
+
+def page_result(items, ordering, kind, page_size):
+    """(items, next_cursor) from the rows keyset_page() returned."""
+    next_cursor = None
+    if len(items) > page_size:
+        last = items[page_size - 1]
+        next_cursor = encode_cursor(kind, [getattr(last, field.lstrip('-')) for field in ordering])
+    return items[:page_size], next_cursor
+
+
+def paginate_queryset(queryset, ordering, kind, cursor=None, page_size=None):
+    """Return (items, next_cursor) for one page of `queryset` ordered by `ordering`."""
+    page_size = page_size or settings.PLACES_PAGE_SIZE
+    items = list(keyset_page(queryset, ordering, kind, cursor, page_size))
+    return page_result(items, ordering, kind, page_size)
+
+
+async def apaginate_queryset(queryset, ordering, kind, cursor=None, page_size=None):
+    """paginate_queryset() for async views."""
+    page_size = page_size or settings.PLACES_PAGE_SIZE
+    items = [item async for item in keyset_page(queryset, ordering, kind, cursor, page_size)]
+    return page_result(items, ordering, kind, page_size)
+
+
+def distance_origin(cursor, default):
+    """The origin a distance cursor was issued for, so later pages rank from the same point."""
+    if not cursor:
+        return default
+    data = decode_cursor(cursor, 'distance')
+    return data['lat'], data['lon']
+
+
+class DistancePager:
+    """
+    One page of places ranked by (distance_km, id) from (lat, lon), read a ring at a time.
+
+    A page only loads the places between the distance its cursor ends at and
+    a radius grown until the ring holds a full page (or reaches `max_km`), so
+    deep pages cost the same as the first. The cursor also carries the width
+    of the ring that filled the page, as the next page's first guess. Use
+    page() from sync code and apage() from async code.
+    """
+
+    def __init__(self, places, lat, lon, max_km, cursor=None, page_size=None):
+        self.places, self.lat, self.lon, self.max_km = places, lat, lon, max_km
+        self.page_size = page_size or settings.PLACES_PAGE_SIZE
+        self.after, self.width = None, settings.DISTANCE_RING_KM
+        if cursor:
+            data = decode_cursor(cursor, 'distance')
+            self.after, self.width = tuple(data['k']), data.get('w', self.width)
+        self.inner = self.after[0] if self.after else 0.0
+        self.ranked = []
+
+    @property
+    def radius(self):
+        return min(self.inner + self.width, self.max_km)
+
+    def ring(self):
+        """The query for places that may lie between the cursor and the current radius."""
+        return self.places.within(self.lat, self.lon, self.radius).beyond(self.lat, self.lon, self.inner).order_by('id')
+
+    def add(self, ring):
+        """Rank one evaluated ring; False if it was short of a page and a wider one is needed."""
+        radius = self.radius
+        self.ranked = rank_by_distance(ring, self.lat, self.lon, max_km=radius)
+        if self.after:
+            self.ranked = [place for place in self.ranked if (place.distance_km, place.pk) > self.after]
+        if len(self.ranked) > self.page_size or radius >= self.max_km:
+            return True
+        # Size the next ring from how densely this one was filled, at least doubling it
+        wanted = (radius ** 2 - self.inner ** 2) * (self.page_size + 1) / max(len(self.ranked), 1)
+        self.width = max(2 * self.width, math.sqrt(self.inner ** 2 + 1.5 * wanted) - self.inner)
+        return False
+
+    def result(self):
+        """(items, next_cursor) once add() has accepted a ring."""
+        items = self.ranked[:self.page_size]
+        next_cursor = None
+        if len(self.ranked) > self.page_size:
+            last = items[-1]
+            next_cursor = encode_cursor(
+                'distance', (last.distance_km, last.pk), lat=self.lat, lon=self.lon, w=self.width,
+            )
+        return items, next_cursor
+
+    def page(self):
+        while not self.add(list(self.ring())):
+            pass
+        return self.result()
+
+    async def apage(self):
+        while not self.add([place async for place in self.ring()]):
+            pass
+        return self.result()
@@ -0,0 +1,143 @@
+import re
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, FloatField, Lookup, Q, TextField
+from django.db.models.expressions import ExpressionWrapper
+from django.utils.module_loading import import_string
+
+# Pluggable full-text search for places.
+# The backend is chosen with settings.PLACES_SEARCH_BACKEND and is kept in sync
+# with Place through the post_save/post_delete receivers in models.py.
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class MatchField(TextField):
+    """An FTS5 table's hidden table-named column, the left side of MATCH."""
+
+
+@MatchField.register_lookup
+class Match(Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', (*lhs_params, *rhs_params)
+
+
+class BaseSearchBackend:
+    # Order of search() results, also used as the keyset pagination key
+    ordering = ['-average_rating', '-id']
+
+    def setup(self):
+        """Create whatever storage the backend needs. Must be idempotent."""
+
+    def index(self, places):
+        """Add or refresh the given places in the index."""
+
+    def remove(self, place_ids):
+        """Drop the given place ids from the index."""
+
+    def rebuild(self):
+        """Re-index every place from scratch, returning the number indexed."""
+        return 0
+
+    def search(self, queryset, query):
+        """Filter `queryset` down to matches for `query`, best matches first."""
+        raise NotImplementedError
+
+
+class LikeSearchBackend(BaseSearchBackend):
+    # Portable fallback: substring scans, ordered by rating only
+    def search(self, queryset, query):
+        return queryset.filter(
+            Q(name__icontains=query) | Q(description__icontains=query) | Q(tags__icontains=query)
+        ).order_by(*self.ordering)
+
+
+class FTS5SearchBackend(BaseSearchBackend):
+    """
+    SQLite FTS5 index over name, description and tags.
+
+    The virtual table keeps its own copy of the text with rowid = Place.id,
+    so updates are a delete + insert of one row. Matches are ranked by bm25
+    (name and tags weigh more than description) scaled up by average_rating.
+    Searches join the index once through PlaceSearchEntry, so the MATCH
+    runs a single time however many places it finds.
+    """
+    table = 'places_place_fts'
+    ordering = ['search_rank', 'id']
+    columns = ('name', 'description', 'tags')
+    weights = (10.0, 1.0, 5.0)
+
+    def setup(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+                f"{', '.join(self.columns)}, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+            # The rank column then scores with our column weights (stored with the index)
+            weights = ', '.join(str(weight) for weight in self.weights)
+            cursor.execute(f"INSERT INTO {self.table} ({self.table}, rank) VALUES ('rank', 'bm25({weights})')")
+
+    def index(self, places):
+        rows = [(place.pk, place.name, place.description, place.tags) for place in places if place.pk]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [(row[0],) for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {self.table} (rowid, {', '.join(self.columns)}) VALUES (%s, %s, %s, %s)",
+                rows,
+            )
+
+    def remove(self, place_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [(pk,) for pk in place_ids])
+
+    def rebuild(self):
+        self.setup()
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, {', '.join(self.columns)}) "
+                f"SELECT id, {', '.join(self.columns)} FROM {apps.get_model('places', 'Place')._meta.db_table}"
+            )
+            cursor.execute(f"INSERT INTO {self.table} ({self.table}) VALUES ('optimize')")
+            cursor.execute(f"SELECT COUNT(*) FROM {self.table}")
+            return cursor.fetchone()[0]
+
+    def match_expression(self, query):
+        # Quote every word so user input can never be parsed as FTS syntax,
+        # and prefix-match the last one to support search-as-you-type.
+        words = WORD_RE.findall(query)
+        if not words:
+            return None
+        terms = [f'"{word}"' for word in words]
+        terms[-1] += '*'
+        return ' '.join(terms)
+
+    def search(self, queryset, query):
+        match = self.match_expression(query)
+        if match is None:
+            return queryset.none()
+        # bm25 is negative (lower is better), so scaling by the rating boost
+        # pushes well-rated places further up when ordering ascending.
+        boost = settings.PLACES_SEARCH_RATING_BOOST
+        return queryset.filter(search_entry__document__match=match).annotate(
+            search_rank=ExpressionWrapper(
+                F('search_entry__rank') * (1 + boost * F('average_rating')), output_field=FloatField(),
+            )
+        ).order_by(*self.ordering)
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    backend = import_string(settings.PLACES_SEARCH_BACKEND)()
+    if isinstance(backend, FTS5SearchBackend) and connection.vendor != 'sqlite':
+        return LikeSearchBackend()
+    return backend
@@ -5,24 +5,97 @@ import os
 
 User = get_user_model()
 
+class PlaceListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # Look up which of these places the user favorited in one query,
+        # instead of one EXISTS per place
+        places = list(data.all() if hasattr(data, 'all') else data)
+        user = self.context['request'].user
+        if user.is_authenticated:
+            ids = [place.pk for place in places]
+            self.context['favorited_ids'] = set(
+                user.favorite_places.filter(id__in=ids).values_list('id', flat=True)
+            )
+        else:
+            self.context['favorited_ids'] = set()
+        return super().to_representation(places)
+
 class PlaceSerializer(serializers.ModelSerializer):
     added_by = serializers.StringRelatedField()  # Show username
     is_favorited = serializers.SerializerMethodField()  # Check if favorited by current user
+    favorites_count = serializers.SerializerMethodField()
+    photo_variants = serializers.ReadOnlyField()
+
+    # Left out of lists unless asked for with ?fields=
+    HEAVY_FIELDS = ('description', 'address')
+    # Columns behind the output fields that aren't columns themselves
+    FIELD_COLUMNS = {
+        'added_by': ('added_by__username', 'added_by__email'),
+        'photo_variants': ('photo_hash',),
+        'is_favorited': (),
+        'favorites_count': (),
+    }
+    # Always loaded: keyset cursors and distance ranking read them
+    BASE_COLUMNS = ('id', 'latitude', 'longitude', 'average_rating')
 
     class Meta:
         model = Place
-        fields = '__all__'
+        # M2M id lists cost a query per row and can be huge; expose a count instead
+        exclude = ['favorites', 'tag_set', 'photo_hash']
+        list_serializer_class = PlaceListSerializer
+
+    def __init__(self, *args, fields=None, **kwargs):
+        # `fields` limits the output to these names, e.g. from sparse_fields()
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
 
     def get_is_favorited(self, obj):
+        favorited_ids = self.context.get('favorited_ids')
+        if favorited_ids is not None:
+            return obj.pk in favorited_ids
         user = self.context['request'].user
         if user.is_authenticated:
             return obj.favorites.filter(id=user.id).exists()
         return False
 
+    def get_favorites_count(self, obj):
+        # Annotated by Place.objects.for_listing(), counted on demand otherwise
+        count = getattr(obj, 'favorites_count', None)
+        return obj.favorites.count() if count is None else count
+
+
+def sparse_fields(request, many=True):
+    """
+    PlaceSerializer fields for ?fields=name,latitude,... or, without it,
+    every field (less HEAVY_FIELDS for lists). Raises ValidationError for
+    a name the serializer doesn't have.
+    """
+    available = list(PlaceSerializer().fields)
+    value = request.query_params.get('fields')
+    if not value:
+        return [name for name in available if not (many and name in PlaceSerializer.HEAVY_FIELDS)]
+    requested = list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in requested if name not in available]
+    if unknown:
+        raise serializers.ValidationError({'fields': f"Unknown fields: {', '.join(unknown)}"})
+    return requested
+
+
+def load_only(queryset, fields):
+    """Defer every column of `queryset` that PlaceSerializer(fields=fields) won't read."""
+    columns = set(PlaceSerializer.BASE_COLUMNS)
+    for name in fields:
+        columns.update(PlaceSerializer.FIELD_COLUMNS.get(name, (name,)))
+    if 'added_by' not in fields:
+        queryset = queryset.select_related(None)
+    return queryset.only(*columns)
+
 class PlaceCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Place
-        fields = ['name', 'type', 'sub_type', 'address', 'latitude', 'longitude', 'price_level', 'description', 'contact_info', 'photos']
+        fields = ['name', 'type', 'sub_type', 'address', 'latitude', 'longitude', 'price_level', 'description', 'contact_info', 'photo']
 
     def create(self, validated_data):
         validated_data['added_by'] = self.context['request'].user
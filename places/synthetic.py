@@ -0,0 +1,189 @@
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+
+from .models import Place, PlaceTag, Tag
+from .search import get_search_backend
+from . import feeds
+from reviews.models import Review
+from Recommenders.models import PlaceNeighbor, StalePlace
+
+# Deterministic synthetic data for load testing and profiling.
+# Places are scattered around real Coimbatore neighbourhoods, and both place
+# popularity and user activity follow Zipf-like distributions, so a handful
+# of places and users account for most reviews, like in production.
+
+User = get_user_model()
+
+USER_PREFIX = 'synth-'  # every synthetic username starts with this, whatever the seed
+
+NEIGHBOURHOODS = [
+    # (name, latitude, longitude, relative weight)
+    ('Gandhipuram', 11.0168, 76.9674, 5),
+    ('Peelamedu', 11.0315, 77.0160, 4),
+    ('RS Puram', 11.0055, 76.9558, 4),
+    ('Avinashi Road', 11.0250, 77.0230, 3),
+    ('Race Course', 11.0027, 76.9796, 2),
+    ('Saibaba Colony', 11.0251, 76.9440, 2),
+    ('Singanallur', 10.9990, 77.0320, 2),
+    ('Saravanampatti', 11.0790, 77.0020, 2),
+    ('Ukkadam', 10.9925, 76.9610, 1),
+    ('Neelambur', 11.0664, 77.0853, 1),
+]
+CLUSTER_SPREAD_DEG = 0.012  # ~1.3km standard deviation around each centre
+SUB_TYPES = {'food': ['mess', 'bakery', 'stall'], 'stay': ['hotel', 'pg', 'hostel', 'rental']}
+PRICE_LEVELS = ['economical', 'average', 'premium']
+NAME_WORDS = [
+    'Annapoorna', 'Sree', 'Krishna', 'Royal', 'Golden', 'Green', 'Kovai', 'Anand', 'Lakshmi',
+    'Grand', 'Classic', 'Park', 'Residency', 'Corner', 'Spice', 'Bliss', 'Nest', 'Comfort',
+]
+TAGS = [
+    'south indian', 'vegetarian', 'non-veg', 'chettinad', 'cafe', 'dessert', 'snacks', 'family',
+    'students', 'budget', 'luxury', 'wifi', 'late-night', 'rooftop', 'ac', 'parking', 'quick bites',
+    'working professionals', 'on-campus', 'spa',
+]
+COMMENTS = [
+    'Absolutely fantastic! A must-visit.',
+    'Good, but could be better. The service was a bit slow.',
+    'An average experience. Nothing too special.',
+    'Loved the ambiance and the quality. Will definitely come back.',
+    "Overpriced for what it is. I've had better.",
+]
+
+
+def zipf_cdf(count, exponent):
+    """Cumulative popularity of `count` items whose weights fall off as 1/rank**exponent."""
+    weights = 1.0 / np.arange(1, count + 1) ** exponent
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
+
+
+class SyntheticData:
+    def __init__(self, seed=42, batch_size=5000, progress=None):
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.batch_size = batch_size
+        self.progress = progress or (lambda label, done, total: None)
+
+    def batches(self, total):
+        for start in range(0, total, self.batch_size):
+            yield start, min(self.batch_size, total - start)
+
+    def users(self, count):
+        prefix = f'{USER_PREFIX}{self.seed}-'
+        offset = User.objects.filter(username__startswith=prefix).count()
+        password = make_password('password')  # hash once, not once per user
+        for start, size in self.batches(count):
+            with transaction.atomic():
+                User.objects.bulk_create([
+                    User(username=f'{prefix}{offset + start + i}', email=f'{prefix}{offset + start + i}@example.com', password=password)
+                    for i in range(size)
+                ])
+            self.progress('users', start + size, count)
+
+    def places(self, count, owner_ids):
+        weights = np.array([n[3] for n in NEIGHBOURHOODS], dtype=np.float64)
+        tag_ids = self.tag_ids()
+        offset = Place.objects.count()  # keeps names unique in append mode
+        for start, size in self.batches(count):
+            clusters = self.rng.choice(len(NEIGHBOURHOODS), size=size, p=weights / weights.sum())
+            offsets = self.rng.normal(0, CLUSTER_SPREAD_DEG, size=(size, 2))
+            kinds = self.rng.choice(['food', 'stay'], size=size, p=[0.7, 0.3])
+            objs = []
+            place_tags = []
+            for i in range(size):
+                area, lat, lon, _ = NEIGHBOURHOODS[clusters[i]]
+                kind = str(kinds[i])
+                tags = [str(tag) for tag in self.rng.choice(TAGS, size=self.rng.integers(2, 5), replace=False)]
+                place_tags.append(tags)
+                objs.append(Place(
+                    name=f"{' '.join(self.rng.choice(NAME_WORDS, size=2))} {offset + start + i}",
+                    type=kind,
+                    sub_type=str(self.rng.choice(SUB_TYPES[kind])),
+                    address=f'{self.rng.integers(1, 400)}, {area}, Coimbatore',
+                    latitude=float(lat + offsets[i, 0]),
+                    longitude=float(lon + offsets[i, 1]),
+                    price_level=str(self.rng.choice(PRICE_LEVELS)),
+                    description=f'A synthetic {kind} spot in {area}.',
+                    tags=', '.join(tags),
+                    is_approved=bool(self.rng.random() < 0.95),
+                    added_by_id=int(self.rng.choice(owner_ids)) if len(owner_ids) else None,
+                ))
+            with transaction.atomic():
+                created = Place.objects.bulk_create(objs)
+                PlaceTag.objects.bulk_create([
+                    PlaceTag(place_id=place.pk, tag_id=tag_ids[tag])
+                    for place, tags in zip(created, place_tags)
+                    for tag in tags
+                ])
+            self.progress('places', start + size, count)
+
+    def tag_ids(self):
+        Tag.objects.bulk_create([Tag(name=name) for name in TAGS], ignore_conflicts=True)
+        return dict(Tag.objects.filter(name__in=TAGS).values_list('name', 'id'))
+
+    def reviews(self, count, place_ids, user_ids):
+        # Popularity rank is shuffled so busy places are spread across clusters
+        place_ids = self.rng.permutation(place_ids)
+        user_ids = self.rng.permutation(user_ids)
+        place_cdf = zipf_cdf(len(place_ids), 1.1)
+        user_cdf = zipf_cdf(len(user_ids), 0.8)
+        quality = self.rng.normal(3.6, 0.6, size=len(place_ids))
+        for start, size in self.batches(count):
+            places = np.searchsorted(place_cdf, self.rng.random(size))
+            users = np.searchsorted(user_cdf, self.rng.random(size))
+            ratings = np.clip(np.rint(quality[places] + self.rng.normal(0, 0.8, size=size)), 1, 5)
+            comments = self.rng.integers(0, len(COMMENTS), size=size)
+            with transaction.atomic():
+                # Ratings are recomputed in one pass at the end instead of per batch
+                Review.objects.bulk_create([
+                    Review(place_id=int(place_ids[p]), user_id=int(user_ids[u]), rating=int(r), comment=COMMENTS[c])
+                    for p, u, r, c in zip(places, users, ratings, comments)
+                ], update_ratings=False)
+            self.progress('reviews', start + size, count)
+
+    def favorites(self, count, place_ids, user_ids):
+        place_ids = self.rng.permutation(place_ids)
+        place_cdf = zipf_cdf(len(place_ids), 1.1)
+        Favorite = Place.favorites.through
+        for start, size in self.batches(count):
+            places = np.searchsorted(place_cdf, self.rng.random(size))
+            users = self.rng.integers(0, len(user_ids), size=size)
+            with transaction.atomic():
+                Favorite.objects.bulk_create([
+                    Favorite(place_id=int(place_ids[p]), user_id=int(user_ids[u]))
+                    for p, u in zip(places, users)
+                ], ignore_conflicts=True)
+            self.progress('favorites', start + size, count)
+
+    def generate(self, places, users, reviews, favorites=0):
+        """Create the whole dataset and bring place ratings up to date."""
+        self.users(users)
+        # Only synthetic users own and review places, so real accounts don't change the dataset
+        synthetic_users = User.objects.filter(username__startswith=USER_PREFIX).order_by('id')
+        user_ids = np.fromiter(synthetic_users.values_list('id', flat=True), dtype=np.int64)
+        self.places(places, user_ids[:max(1, len(user_ids) // 20)])
+        place_ids = np.fromiter(Place.objects.order_by('id').values_list('id', flat=True), dtype=np.int64)
+        if len(place_ids) and len(user_ids):
+            self.reviews(reviews, place_ids, user_ids)
+            self.favorites(favorites, place_ids, user_ids)
+        Place.objects.recompute_ratings_in_chunks(self.batch_size, progress=self.progress)
+        feeds.invalidate()
+
+
+def wipe():
+    """
+    Empty every place-related table with plain DELETEs, skipping per-row
+    signals, and delete the synthetic users so the next run with the same
+    seed starts from the same user pool.
+    """
+    models = [PlaceNeighbor, StalePlace, PlaceTag, Place.favorites.through, Review, Place]
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            for model in models:
+                cursor.execute(f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)}')
+        # Through the ORM: other apps' rows (codes, tokens) cascade with them
+        User.objects.filter(username__startswith=USER_PREFIX).delete()
+    get_search_backend().rebuild()
+    feeds.invalidate()
@@ -0,0 +1,12 @@
+from .models import Place
+
+# Helpers shared by the test modules of places and the apps built on it.
+
+
+def make_place(name, lat, lon, **kwargs):
+    defaults = {
+        'type': 'food', 'sub_type': 'mess', 'address': 'Coimbatore',
+        'price_level': 'average', 'is_approved': True,
+    }
+    defaults.update(kwargs)
+    return Place.objects.create(name=name, latitude=lat, longitude=lon, **defaults)
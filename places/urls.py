@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import HomeView, SearchView, AddPlaceView, AddReviewView, PlaceDetailView
+from .views import HomeView, SearchView, AddPlaceView, AddReviewView, PlaceDetailView, PlaceReviewsView, NearbyPlacesAPIView, SearchAPIView, PlaceListAPIView, PlaceDetailAPIView, PlaceImportAPIView, ModerationView
 
 urlpatterns = [
     path('', HomeView.as_view(), name='home'),
@@ -7,4 +7,11 @@ urlpatterns = [
     path('add-place/', AddPlaceView.as_view(), name='add_place'),
     path('add-review/', AddReviewView.as_view(), name='add_review'),
     path('<int:pk>/', PlaceDetailView.as_view(), name='place_detail'),
+    path('<int:pk>/reviews/', PlaceReviewsView.as_view(), name='place_reviews'),
+    path('moderation/', ModerationView.as_view(), name='moderation'),
+    path('api/nearby/', NearbyPlacesAPIView.as_view(), name='api_nearby'),
+    path('api/search/', SearchAPIView.as_view(), name='api_search'),
+    path('api/places/', PlaceListAPIView.as_view(), name='api_places'),
+    path('api/places/<int:pk>/', PlaceDetailAPIView.as_view(), name='api_place_detail'),
+    path('api/places/import/', PlaceImportAPIView.as_view(), name='api_place_import'),
 ]
\ No newline at end of file
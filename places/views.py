@@ -2,19 +2,64 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.views import View
 from .models import Place
 from .forms import AddPlaceForm
+from .search import get_search_backend
+from . import dedup, feeds, geo, images, importer, moderation
 from reviews.forms import AddReviewForm, ReviewFormForDetailPage
+from reviews.models import REVIEW_ORDERING, Review
+from django.core.cache import cache
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Q
+from django.contrib.admin.views.decorators import staff_member_required
 import os
 from django.conf import settings
 from uuid import uuid4
 from django.contrib import messages
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.parsers import MultiPartParser
+from .serializers import PlaceSerializer, load_only, sparse_fields
+from .pagination import InvalidCursor, get_page_size, keyset_page, page_result, paginate_queryset, DistancePager, distance_origin
+from django.http import HttpResponse, HttpResponseBadRequest
+from django.views.static import serve
+from django.utils.decorators import method_decorator
+from .conditional import listing_condition, place_condition
+from citymate.db import pin_to_primary, replica_reads
+
+
+def get_user_location(request):
+    """
+    Best known (lat, lon) for the current user.
+
+    Explicit ?lat=&lon= query params win and are remembered in the session,
+    otherwise fall back to the last known location or the city centre.
+    Raises geo.InvalidLocation for params that aren't a point on the globe.
+    """
+    try:
+        location = (float(request.GET['lat']), float(request.GET['lon']))
+    except (KeyError, ValueError):
+        location = request.session.get('location')
+        if location:
+            return tuple(location)
+        return tuple(settings.CITYMATE_DEFAULT_LOCATION)
+    geo.check_point(*location)
+    request.session['location'] = location
+    return location
+
 
 class HomeView(LoginRequiredMixin, View):
+    @method_decorator(replica_reads)
     def get(self, request):
-        trending_places = Place.objects.filter(is_approved=True).order_by('-average_rating')[:10]
-        nearby_places = Place.objects.filter(is_approved=True).order_by('?')[:10]
-        recommendations = Place.objects.filter(is_approved=True, type='food').order_by('?')[:10]
+        try:
+            lat, lon = get_user_location(request)
+        except geo.InvalidLocation as e:
+            return HttpResponseBadRequest(str(e))
+        trending_places = feeds.trending()
+        nearby_places = feeds.nearby(lat, lon)
+        recommendations = feeds.recommendations(request.user, lat, lon)
 
         context = {
             'trending_places': trending_places,
@@ -23,27 +68,150 @@ class HomeView(LoginRequiredMixin, View):
         }
         return render(request, 'places/home.html', context)
 
+def search_places(request, places=None):
+    """
+    Run a place search from the request's query params and return one page.
+
+    Results are ordered by relevance when there is a query, by rating
+    otherwise, or by distance with sort=distance, and paged with a keyset
+    cursor (?cursor=) in pages of at most PLACES_MAX_PAGE_SIZE.
+    Raises InvalidCursor for a tampered or mismatched cursor and
+    geo.InvalidLocation for an impossible location or radius. `places` is
+    the queryset to search, approved places by default.
+    """
+    search = prepare_search(request, places)
+    rows = search['rows'].page() if search['sort'] == 'distance' else list(search['rows'])
+    return finish_search(search, list(search['facets']), rows)
+
+
+def prepare_search(request, places=None):
+    """
+    The search_places() queries, not yet run: 'facets' and 'rows' can be
+    evaluated in either order (or at once, from async code) and handed to
+    finish_search(). With sort=distance 'rows' is a DistancePager, which
+    reads its page with page() or apage().
+    """
+    query = request.GET.get('q', '')
+    location = request.GET.get('location', '')
+    min_rating = request.GET.get('min_rating', '0')
+    price = request.GET.get('price', '')
+    sort = request.GET.get('sort', '')
+    tags = request.GET.getlist('tag')
+    tag_mode = 'any' if request.GET.get('tag_mode') == 'any' else 'all'
+    cursor = request.GET.get('cursor')
+    page_size = get_page_size(request.GET.get('page_size'))
+    try:
+        max_km = float(request.GET['max_km'])
+    except (KeyError, ValueError):
+        max_km = None
+    else:
+        geo.check_radius(max_km, 'max_km')
+
+    results = Place.objects.filter(is_approved=True) if places is None else places
+
+    if query:
+        backend = get_search_backend()
+        results = backend.search(results, query)
+        ordering, kind = backend.ordering, 'relevance'
+    else:
+        ordering, kind = ['-average_rating', '-id'], 'rating'
+    if location:
+        results = results.filter(address__icontains=location)
+    if min_rating and min_rating != '0':
+        results = results.filter(average_rating__gte=float(min_rating))
+    if price:
+        results = results.filter(price_level=price)
+    if tags:
+        results = results.with_tags(tags, match=tag_mode)
+
+    by_distance = sort == 'distance' or max_km is not None
+    if by_distance:
+        lat, lon = get_user_location(request)
+    if sort == 'distance':
+        # Ranking by distance happens in Python, so always bound the candidates
+        lat, lon = distance_origin(cursor, (lat, lon))
+        max_km = settings.NEARBY_MAX_RADIUS_KM if max_km is None else max_km
+    candidates = results
+    if max_km is not None:
+        max_km = min(max(max_km, 0.1), settings.NEARBY_MAX_RADIUS_KM)
+        results = results.within(lat, lon, max_km).closer_than(lat, lon, max_km)
+
+    if sort == 'distance':
+        # Each page ranks only the ring of candidates past the cursor
+        rows = DistancePager(candidates, lat, lon, max_km, cursor, page_size)
+    else:
+        rows = keyset_page(results, ordering, kind, cursor, page_size)
+    return {
+        'facets': results.tag_facet_query(),
+        'rows': rows,
+        'ordering': ordering,
+        'kind': kind,
+        'cursor': cursor,
+        'page_size': page_size,
+        'origin': (lat, lon) if by_distance else None,
+        'sort': sort,
+        'max_km': max_km,
+        'tags': tags,
+        'tag_mode': tag_mode,
+    }
+
+
+def finish_search(search, facets, rows):
+    """The search_places() result from the evaluated prepare_search() queries (or the pager's page)."""
+    max_km, page_size = search['max_km'], search['page_size']
+    if search['sort'] == 'distance':
+        page, next_cursor = rows
+    else:
+        page, next_cursor = page_result(rows, search['ordering'], search['kind'], page_size)
+
+    return {
+        'results': page,
+        'next_cursor': next_cursor,
+        'sort': search['sort'],
+        'max_km': max_km,
+        'tags': search['tags'],
+        'tag_mode': search['tag_mode'],
+        'facets': facets,
+    }
+
+
 class SearchView(LoginRequiredMixin, View):
+    @method_decorator(replica_reads)
+    @method_decorator(listing_condition)
     def get(self, request):
-        query = request.GET.get('q', '')
-        location = request.GET.get('location', '')
-        min_rating = request.GET.get('min_rating', '0')
-        price = request.GET.get('price', '')
+        try:
+            context = search_places(request)
+        except InvalidCursor:
+            return HttpResponseBadRequest('Invalid cursor')
+        except geo.InvalidLocation as e:
+            return HttpResponseBadRequest(str(e))
+        if context['next_cursor']:
+            params = request.GET.copy()
+            params['cursor'] = context['next_cursor']
+            context['next_query'] = params.urlencode()
+        return render(request, 'places/search.html', context)
 
-        results = Place.objects.filter(is_approved=True)
 
-        if query:
-            results = results.filter(
-                Q(name__icontains=query) | Q(description__icontains=query) | Q(tags__icontains=query)
-            )
-        if location:
-            results = results.filter(address__icontains=location)
-        if min_rating and min_rating != '0':
-            results = results.filter(average_rating__gte=float(min_rating))
-        if price:
-            results = results.filter(price_level=price)
+class SearchAPIView(APIView):
+    permission_classes = [IsAuthenticated]
 
-        return render(request, 'places/search.html', {'results': results})
+    @method_decorator(listing_condition)
+    def get(self, request):
+        fields = sparse_fields(request)
+        places = load_only(Place.objects.for_listing().filter(is_approved=True), fields)
+        try:
+            context = search_places(request, places)
+        except (InvalidCursor, geo.InvalidLocation) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        data = PlaceSerializer(context['results'], many=True, fields=fields, context={'request': request}).data
+        if context['sort'] == 'distance':
+            for item, place in zip(data, context['results']):
+                item['distance_km'] = round(place.distance_km, 3)
+        return Response({
+            'results': data,
+            'next': context['next_cursor'],
+            'facets': [{'tag': name, 'count': count} for name, count in context['facets']],
+        })
 
 class AddPlaceView(LoginRequiredMixin, View):
     def get(self, request):
@@ -55,11 +223,23 @@ class AddPlaceView(LoginRequiredMixin, View):
             form = AddPlaceForm(request.POST, request.FILES)
             if form.is_valid():
                 place = form.save(commit=False)
-                
                 if 'photo' in request.FILES:
-                    place.photo = request.FILES['photo']
-                
+                    images.attach_photo(place, request.FILES['photo'])
+                else:
+                    images.attach_processed(place, request.POST.get('photo_hash', ''))
+                # Ask before listing what looks like a place we already have.
+                # A file input can't survive the round-trip, so the photo was
+                # processed above and comes back by its hash
+                if not request.POST.get('not_duplicate'):
+                    data = form.cleaned_data
+                    duplicates = dedup.similar_places(data['name'], data['latitude'], data['longitude'])
+                    if duplicates:
+                        return render(request, 'places/add_place.html', {
+                            'form': form, 'duplicates': duplicates, 'photo_hash': place.photo_hash,
+                        })
+
                 place.save()
+                form.save_m2m()
                 return redirect('place_detail', pk=place.pk)
         else:
             form = AddPlaceForm()
@@ -76,16 +256,53 @@ class AddReviewView(LoginRequiredMixin, View):
         if form.is_valid():
             review = form.save(commit=False)
             review.user = request.user
-            review.save()
+            with transaction.atomic():
+                review.save()
+            pin_to_primary(request)
             return redirect('place_detail', pk=review.place.pk)
         return render(request, 'places/add_review.html', {'form': form})
 
 
+def review_page(place_id, cursor=None):
+    """(reviews, next_cursor) for one page of a place's reviews, newest first."""
+    return paginate_queryset(
+        Review.objects.for_place(place_id), REVIEW_ORDERING, 'reviews', cursor, settings.PLACE_REVIEWS_PAGE_SIZE,
+    )
+
+
+def render_review_page(place_id, reviews, next_cursor, first_page=False):
+    return render_to_string('places/review_list.html', {
+        'place_id': place_id, 'reviews': reviews, 'next_cursor': next_cursor, 'first_page': first_page,
+    })
+
+
+def review_page_key(place_id, version, updated_at):
+    # Every review write bumps Place.version (see the rating receivers), so
+    # keying the cached fragment on it retires the old fragment without a delete
+    return f'place:{place_id}:reviews:{version}:{updated_at.timestamp()}'
+
+
+def first_review_page(place):
+    """The rendered first page of reviews for the place page, cached until the place changes."""
+    key = review_page_key(place.pk, place.version, place.updated_at)
+    html = cache.get(key)
+    if html is None:
+        html = render_review_page(place.pk, *review_page(place.pk), first_page=True)
+        cache.set(key, html, settings.REVIEW_FRAGMENT_TTL)
+    return mark_safe(html)
+
+
 class PlaceDetailView(LoginRequiredMixin, View):
+    def render_page(self, request, place, review_form):
+        return render(request, 'places/place_detail.html', {
+            'place': place, 'review_form': review_form, 'reviews_html': first_review_page(place),
+        })
+
+    @method_decorator(replica_reads)
+    @method_decorator(place_condition)
     def get(self, request, pk):
         place = get_object_or_404(Place, pk=pk)
-        review_form = ReviewFormForDetailPage()
-        return render(request, 'places/place_detail.html', {'place': place, 'review_form': review_form})
+        return self.render_page(request, place, ReviewFormForDetailPage())
 
     def post(self, request, pk):
         place = get_object_or_404(Place, pk=pk)
@@ -95,8 +312,148 @@ class PlaceDetailView(LoginRequiredMixin, View):
             review = review_form.save(commit=False)
             review.user = request.user
             review.place = place 
-            review.save()
+            # The review and the rating update its receivers make commit
+            # together, in one write transaction
+            with transaction.atomic():
+                review.save()
+            pin_to_primary(request)
             messages.success(request, 'Thank you! Your review has been added.')
             return redirect('place_detail', pk=pk)
         
-        return render(request, 'places/place_detail.html', {'place': place, 'review_form': review_form})
\ No newline at end of file
+        return self.render_page(request, place, review_form)
+
+
+class PlaceReviewsView(LoginRequiredMixin, View):
+    """The "load more" fragment: the page of reviews after `cursor`."""
+
+    def get(self, request, pk):
+        try:
+            reviews, next_cursor = review_page(pk, request.GET.get('cursor'))
+        except InvalidCursor as e:
+            return HttpResponseBadRequest(str(e))
+        return HttpResponse(render_review_page(pk, reviews, next_cursor))
+
+
+class NearbyPlacesAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @method_decorator(listing_condition)
+    def get(self, request):
+        try:
+            lat = float(request.query_params['lat'])
+            lon = float(request.query_params['lon'])
+            radius_km = float(request.query_params.get('radius_km', settings.NEARBY_RADIUS_KM))
+            k = int(request.query_params.get('k', 10))
+        except (KeyError, ValueError):
+            return Response({"error": "lat and lon are required numbers"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            geo.check_point(lat, lon)
+            geo.check_radius(radius_km)
+        except geo.InvalidLocation as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        radius_km = min(max(radius_km, 0.1), settings.NEARBY_MAX_RADIUS_KM)
+        k = min(max(k, 1), 50)
+
+        fields = sparse_fields(request)
+        places = load_only(Place.objects.for_listing().filter(is_approved=True), fields).nearby(lat, lon, radius_km, k)
+        data = PlaceSerializer(places, many=True, fields=fields, context={'request': request}).data
+        for item, place in zip(data, places):
+            item['distance_km'] = round(place.distance_km, 3)
+        return Response(data)
+
+
+class PlaceListAPIView(APIView):
+    """
+    Approved places, best rated first, for clients that page through
+    everything (?type=, ?sub_type=, ?cursor=, ?page_size=, ?fields=).
+    """
+    permission_classes = [IsAuthenticated]
+    ordering = ['-average_rating', '-id']
+
+    @method_decorator(listing_condition)
+    def get(self, request):
+        fields = sparse_fields(request)
+        places = load_only(Place.objects.for_listing().filter(is_approved=True), fields)
+        for param in ('type', 'sub_type'):
+            if request.query_params.get(param):
+                places = places.filter(**{param: request.query_params[param]})
+        try:
+            results, next_cursor = paginate_queryset(
+                places, self.ordering, 'rating', request.query_params.get('cursor'),
+                get_page_size(request.query_params.get('page_size')),
+            )
+        except InvalidCursor as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        data = PlaceSerializer(results, many=True, fields=fields, context={'request': request}).data
+        return Response({'results': data, 'next': next_cursor})
+
+
+class PlaceDetailAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        fields = sparse_fields(request, many=False)
+        place = get_object_or_404(load_only(Place.objects.for_listing().filter(is_approved=True), fields), pk=pk)
+        return Response(PlaceSerializer(place, fields=fields, context={'request': request}).data)
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class ModerationView(View):
+    """Staff queue of places waiting for approval (?queue=pending) or reported by users (?queue=reported)."""
+    actions = {'approve': (moderation.approve, 'Approved'), 'reject': (moderation.reject, 'Rejected')}
+
+    def get_queue(self, request):
+        queue = request.GET.get('queue', 'pending')
+        return queue if queue in moderation.QUEUES else 'pending'
+
+    def get(self, request):
+        queue = self.get_queue(request)
+        try:
+            places, next_cursor = moderation.queue_page(
+                queue, request.GET.get('cursor'), get_page_size(request.GET.get('page_size')),
+            )
+        except InvalidCursor as e:
+            return HttpResponseBadRequest(str(e))
+        return render(request, 'places/moderation.html', {
+            'queue': queue, 'queues': list(moderation.QUEUES), 'places': places, 'next_cursor': next_cursor,
+        })
+
+    def post(self, request):
+        action = self.actions.get(request.POST.get('action'))
+        ids = [int(pk) for pk in request.POST.getlist('place') if pk.isdigit()]
+        if action is None or not ids:
+            messages.warning(request, 'Select some places and an action.')
+        else:
+            apply, done = action
+            messages.success(request, f'{done} {apply(ids)} places.')
+        return redirect(request.get_full_path())
+
+
+class PlaceImportAPIView(APIView):
+    """
+    Staff-only bulk import: POST a CSV or JSON Lines `file` (format from
+    ?input_format= or the file name; ?format= is DRF's renderer override).
+    Large uploads are spooled to disk by Django and read back a row at a time.
+    """
+    permission_classes = [IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "Upload the rows as 'file'"}, status=status.HTTP_400_BAD_REQUEST)
+        fmt = request.query_params.get('input_format') or importer.guess_format(upload.name)
+        if fmt not in importer.FORMATS:
+            return Response({"error": f"input_format must be one of {', '.join(importer.FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        approve = request.query_params.get('approve') in ('1', 'true')
+        result = importer.PlaceImporter(added_by=request.user, approve=approve).run(importer.text_stream(upload), fmt)
+        return Response(result.as_dict())
+
+
+def serve_media(request, path):
+    """Development media server that sends the same Cache-Control as production should for photo variants."""
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    cache_control = images.cache_control(path)
+    if cache_control:
+        response['Cache-Control'] = cache_control
+    return response
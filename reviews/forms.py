@@ -0,0 +1,24 @@
+from django import forms
+from .models import Review
+
+RATING_CHOICES = [(i, f'{i} Star{"s" if i > 1 else ""}') for i in range(5, 0, -1)]
+
+class AddReviewForm(forms.ModelForm):
+    class Meta:
+        model = Review
+        fields = ['place', 'rating', 'comment']
+        widgets = {
+            'place': forms.Select(attrs={'class': 'form-select'}),
+            'rating': forms.Select(choices=RATING_CHOICES, attrs={'class': 'form-select'}),
+            'comment': forms.Textarea(attrs={'class': 'form-control', 'rows': 4}),
+        }
+
+class ReviewFormForDetailPage(forms.ModelForm):
+    # Place comes from the URL on the detail page
+    class Meta:
+        model = Review
+        fields = ['rating', 'comment']
+        widgets = {
+            'rating': forms.Select(choices=RATING_CHOICES, attrs={'class': 'form-select'}),
+            'comment': forms.Textarea(attrs={'class': 'form-control', 'rows': 3, 'placeholder': 'Share your experience'}),
+        }
@@ -1,6 +1,39 @@
 from django.db import models
 from django.conf import settings
 from places.models import Place  
+from places import feeds
+
+# Newest first; matches the (place, -created_at, -id) index so a page of a
+# place's reviews is a short index range scan however many it has.
+REVIEW_ORDERING = ['-created_at', '-id']
+
+
+class ReviewQuerySet(models.QuerySet):
+    def for_place(self, place_id):
+        """Reviews of one place with their authors, ready for keyset paging by REVIEW_ORDERING."""
+        return self.filter(place_id=place_id).select_related('user')
+
+    def bulk_create(self, objs, *args, update_ratings=True, **kwargs):
+        # bulk_create skips post_save, so roll the new reviews into the
+        # place rating totals here: one UPDATE per affected place. Large
+        # loads can pass update_ratings=False and recompute_ratings after.
+        from Recommenders.models import StalePlace
+        created = super().bulk_create(objs, *args, **kwargs)
+        # Nor do the neighbor lists hear about them through the receivers
+        StalePlace.mark({review.place_id for review in created})
+        if not update_ratings:
+            return created
+        totals = {}
+        for review in created:
+            count, rating_sum = totals.get(review.place_id, (0, 0))
+            totals[review.place_id] = (count + 1, rating_sum + review.rating)
+            review.remember_loaded_values()
+        for place_id, (count, rating_sum) in totals.items():
+            Place.objects.filter(pk=place_id).apply_rating_delta(count, rating_sum)
+        if totals:
+            feeds.invalidate(*feeds.RATING_FEEDS)
+        return created
+
 
 class Review(models.Model):
     user = models.ForeignKey(
@@ -17,5 +50,30 @@ class Review(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = ReviewQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=['place', '-created_at', '-id'])]
+
+    # place/rating as last read from or written to the database, so the
+    # rating receivers can apply deltas without re-reading the row
+    _loaded_place_id = None
+    _loaded_rating = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_loaded_values()
+        return instance
+
+    def remember_loaded_values(self):
+        self._loaded_place_id = self.__dict__.get('place_id')
+        self._loaded_rating = self.__dict__.get('rating')
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Only now, so every post_save receiver still sees the old values
+        self.remember_loaded_values()
+
     def __str__(self):
         return f"{self.user.username} review on {self.place.name}"
@@ -1,3 +1,66 @@
+from io import StringIO
 from django.test import TestCase
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from places.models import Place
+from .models import Review
 
-# Create your tests here.
+User = get_user_model()
+
+
+class RatingAggregationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='rater', password='pass')
+        self.place = Place.objects.create(
+            name='Mess', type='food', sub_type='mess', address='Peelamedu',
+            latitude=11.03, longitude=77.01, price_level='average', is_approved=True,
+        )
+        self.other = Place.objects.create(
+            name='Bakery', type='food', sub_type='bakery', address='Peelamedu',
+            latitude=11.03, longitude=77.01, price_level='average', is_approved=True,
+        )
+
+    def assertRating(self, place, count, total, average):
+        place.refresh_from_db()
+        self.assertEqual((place.review_count, place.rating_sum), (count, total))
+        self.assertAlmostEqual(place.average_rating, average)
+
+    def test_create_update_delete(self):
+        review = Review.objects.create(user=self.user, place=self.place, rating=4)
+        Review.objects.create(user=self.user, place=self.place, rating=2)
+        self.assertRating(self.place, 2, 6, 3.0)
+
+        review.rating = 5
+        review.save()
+        self.assertRating(self.place, 2, 7, 3.5)
+
+        review = Review.objects.get(pk=review.pk)
+        review.place = self.other
+        review.save()
+        self.assertRating(self.place, 1, 2, 2.0)
+        self.assertRating(self.other, 1, 5, 5.0)
+
+        Review.objects.filter(place=self.place).delete()
+        self.assertRating(self.place, 0, 0, 0.0)
+
+    def test_update_is_constant_queries(self):
+        review = Review.objects.create(user=self.user, place=self.place, rating=4)
+        review.rating = 3
+        with self.assertNumQueries(3):  # review UPDATE, place UPDATE, recommender stale mark
+            review.save()
+
+    def test_bulk_create(self):
+        Review.objects.bulk_create([
+            Review(user=self.user, place=self.place, rating=5),
+            Review(user=self.user, place=self.place, rating=3),
+            Review(user=self.user, place=self.other, rating=1),
+        ])
+        self.assertRating(self.place, 2, 8, 4.0)
+        self.assertRating(self.other, 1, 1, 1.0)
+
+    def test_recompute_repairs_drift(self):
+        Review.objects.create(user=self.user, place=self.place, rating=4)
+        Place.objects.update(review_count=10, rating_sum=3, average_rating=0.3)
+        call_command('recompute_ratings', chunk_size=1, stdout=StringIO())
+        self.assertRating(self.place, 1, 4, 4.0)
+        self.assertRating(self.other, 0, 0, 0.0)
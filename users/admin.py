@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, OTP
+from django.utils import timezone
+from .models import User, OTP, OutboundMessage
 
 class CustomUserAdmin(UserAdmin):
     list_display = ('username', 'email', 'phone_number', 'age', 'is_verified', 'user_type')
@@ -11,4 +12,16 @@ class CustomUserAdmin(UserAdmin):
     )
 
 admin.site.register(User, CustomUserAdmin)
-admin.site.register(OTP)
\ No newline at end of file
+admin.site.register(OTP)
+
+class OutboundMessageAdmin(admin.ModelAdmin):
+    list_display = ('channel', 'recipient', 'status', 'attempts', 'next_attempt_at', 'created_at')
+    list_filter = ('status', 'channel')
+    search_fields = ('recipient',)
+    actions = ['retry_now']
+
+    def retry_now(self, request, queryset):
+        queryset.exclude(status=OutboundMessage.SENT).update(status=OutboundMessage.PENDING, next_attempt_at=timezone.now())
+    retry_now.short_description = 'Retry selected messages now'
+
+admin.site.register(OutboundMessage, OutboundMessageAdmin)
\ No newline at end of file
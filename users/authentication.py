@@ -0,0 +1,52 @@
+from django.utils.functional import SimpleLazyObject
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from .models import User, cache_user, get_cached_user
+
+
+class LazyUser(SimpleLazyObject):
+    """An authenticated user known by pk; the row is only loaded if the view reads more than that."""
+
+    def __init__(self, pk):
+        pk = User._meta.pk.to_python(pk)  # tokens carry it as a string
+        super().__init__(lambda: User.objects.get(pk=pk))
+        self.__dict__.update(pk=pk, id=pk, is_authenticated=True, is_anonymous=False)
+
+    def __bool__(self):
+        return True
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that checks the user against a cache entry instead of
+    running a primary-key query on every request. The entry holds only
+    is_active and a hash of the password hash for the revoke check; views
+    that need the rest of the user load it on first use. User writes retire
+    the entry once they commit (see users.models), and a miss falls back to
+    the database.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        entry, version = get_cached_user(user_id)
+        if entry is None:
+            user = super().get_user(validated_token)
+            cache_user(user.pk, version, {
+                'is_active': user.is_active, 'password': get_md5_hash_password(user.password),
+            })
+            return user
+
+        # The same checks JWTAuthentication makes on a freshly loaded row
+        if api_settings.CHECK_USER_IS_ACTIVE and not entry['is_active']:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != entry['password']:
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return LazyUser(user_id)
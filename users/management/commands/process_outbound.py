@@ -0,0 +1,59 @@
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from users import outbound
+
+
+class Command(BaseCommand):
+    help = 'Delivers queued OTP emails and SMS with a pool of worker threads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--batch-size', type=int, default=settings.OUTBOUND_BATCH_SIZE)
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is drained.')
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        self.handled = 0
+        self.lock = threading.Lock()
+        if options['workers'] == 1:
+            self.work(options)
+        else:
+            threads = [
+                threading.Thread(target=self.work, args=(options,), daemon=True)
+                for _ in range(options['workers'])
+            ]
+            for thread in threads:
+                thread.start()
+            try:
+                for thread in threads:
+                    while thread.is_alive():
+                        thread.join(timeout=1)
+            except KeyboardInterrupt:
+                self.stop.set()
+                for thread in threads:
+                    thread.join()
+        self.stdout.write(self.style.SUCCESS(f'Handled {self.handled} messages.'))
+
+    def work(self, options):
+        # Each thread keeps its own backends, and so its own SMTP session, for its whole life
+        worker_id = uuid.uuid4().hex
+        backends = outbound.get_backends()
+        try:
+            while not self.stop.is_set():
+                count = outbound.process_batch(backends, options['batch_size'], worker_id)
+                with self.lock:
+                    self.handled += count
+                if not count:
+                    if options['once']:
+                        return
+                    self.stop.wait(options['poll_interval'])
+        finally:
+            for backend in backends.values():
+                backend.close()
+            if threading.current_thread() is not threading.main_thread():
+                connection.close()
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from users import outbound
+from users.otp import get_otp_store
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes expired one-time codes, and queued messages carrying codes that are sent or expired, '
+        'in batches. Run it from cron, e.g. every hour.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = get_otp_store().purge_expired(options['batch_size'])
+        messages = outbound.purge_expired(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired codes and {messages} code messages.'))
@@ -1,8 +1,32 @@
-from django.contrib.auth.models import AbstractUser
-from django.db import models
+import time
+
+from django.contrib.auth.models import AbstractUser, UserManager
+from django.db import models, transaction
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils import timezone
-import random
-import string
+from django.utils.crypto import get_random_string, salted_hmac
+
+def generate_code():
+    return get_random_string(6, allowed_chars='0123456789')
+
+def hash_code(code):
+    """Keyed hash of an OTP code, so a leaked table or cache doesn't leak live codes."""
+    return salted_hmac('users.OTP', code).hexdigest()
+
+class UserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # update() skips post_save, so drop these users' cached copies here
+        # (deactivating an account this way must still lock it out)
+        pks = list(self.values_list('pk', flat=True))
+        rows = super().update(**kwargs)
+        forget_cached_users(pks)
+        return rows
+
+class CachedUserManager(UserManager.from_queryset(UserQuerySet)):
+    pass
 
 class User(AbstractUser):
     phone_number = models.CharField(max_length=15, unique=True, blank=True, null=True)
@@ -17,22 +41,141 @@ class User(AbstractUser):
     email_verified = models.BooleanField(default=False)
     phone_verified = models.BooleanField(default=False)
 
+    objects = CachedUserManager()
+
     def __str__(self):
         return self.username or self.email
 
+# Users cached for token authentication (users/authentication.py).
+# An entry holds only what authentication checks, never the row itself.
+# Every user has a version counter in the cache that each committed write
+# bumps, and entries are keyed by it: a request that loaded the row before
+# a write committed caches it under the old version, which nobody reads
+# any more. Bump USER_CACHE_VERSION when the entry's contents change.
+USER_CACHE_VERSION = 2
+
+def user_version_key(pk):
+    return f'users:version:{pk}'
+
+def user_cache_key(pk, version):
+    return f'users:user:v{USER_CACHE_VERSION}:{pk}:{version}'
+
+def initial_user_version():
+    # From the clock, so an evicted counter never comes back at a version
+    # that still has an entry
+    return time.time_ns() // 1000
+
+def get_cached_user(pk):
+    """(entry or None, version); a miss is filled with cache_user(pk, version, ...) once the row is loaded."""
+    version = cache.get_or_set(user_version_key(pk), initial_user_version, timeout=None)
+    return cache.get(user_cache_key(pk, version)), version
+
+def cache_user(pk, version, entry):
+    # add(), not set(): of two requests that both missed, the first one wins
+    cache.add(user_cache_key(pk, version), entry, settings.USER_CACHE_TTL)
+
+def bump_user_version(pk):
+    key = user_version_key(pk)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, initial_user_version(), timeout=None)
+
+def forget_cached_users(pks):
+    # Only once the write commits, so a rolled back write never retires the
+    # entry and the next request can't cache the row from before the commit
+    # under the new version
+    pks = list(pks)
+    if pks:
+        transaction.on_commit(lambda: [bump_user_version(pk) for pk in pks])
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    forget_cached_users([instance.pk])
+
+class OTPQuerySet(models.QuerySet):
+    def valid(self):
+        return self.filter(expires_at__gt=timezone.now())
+
+    def matching(self, code, identifier, type):
+        """Unexpired OTPs of `type` for `code` sent to `identifier`."""
+        return self.valid().filter(identifier=identifier, type=type, code_hash=hash_code(code))
+
 class OTP(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    code = models.CharField(max_length=6)
+    # Email address or phone number the code was sent to
+    identifier = models.CharField(max_length=254, blank=True)
+    code_hash = models.CharField(max_length=64)
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField()
     type = models.CharField(max_length=10, choices=[('email', 'Email'), ('phone', 'Phone')])
+    # Wrong codes tried against this one; it is deleted at OTP_MAX_ATTEMPTS
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    objects = OTPQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Verification always names the recipient, never a code alone
+            models.Index(fields=['identifier', 'type', 'code_hash']),
+            models.Index(fields=['expires_at']),
+        ]
+
+    # The plain code only lives on the instance that generated it
+    @property
+    def code(self):
+        return getattr(self, '_code', None)
+
+    @code.setter
+    def code(self, value):
+        self._code = value
+        self.code_hash = hash_code(value) if value else ''
 
     def save(self, *args, **kwargs):
-        if not self.code:
-            self.code = ''.join(random.choices(string.digits, k=6))
+        if not self.code_hash:
+            self.code = generate_code()
+        if not self.identifier:
+            self.identifier = (self.user.email if self.type == 'email' else self.user.phone_number) or ''
         if not self.expires_at:
-            self.expires_at = timezone.now() + timezone.timedelta(minutes=10)
+            self.expires_at = timezone.now() + timezone.timedelta(seconds=settings.OTP_TTL_SECONDS)
         super().save(*args, **kwargs)
 
     def is_valid(self):
-        return timezone.now() < self.expires_at
\ No newline at end of file
+        return timezone.now() < self.expires_at
+
+class OutboundMessage(models.Model):
+    """An email or SMS waiting to be delivered by the outbound worker (see users/outbound.py)."""
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+    channel = models.CharField(max_length=10, choices=[('email', 'Email'), ('sms', 'SMS')])
+    recipient = models.CharField(max_length=254)
+    subject = models.CharField(max_length=200, blank=True)
+    body = models.TextField()
+    # Set for messages carrying a one-time code: the body is cleared once
+    # sent, and the message is dropped instead of sent late
+    expires_at = models.DateTimeField(null=True, blank=True)
+    status = models.CharField(
+        max_length=10,
+        choices=[(PENDING, 'Pending'), (SENDING, 'Sending'), (SENT, 'Sent'), (FAILED, 'Failed')],
+        default=PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=32, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker's claim query: due rows in one status, oldest first
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.channel} to {self.recipient} ({self.status})'
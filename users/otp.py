@@ -0,0 +1,114 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils.crypto import constant_time_compare
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OTP, User, generate_code, hash_code
+
+# Where one-time codes live between "send" and "verify".
+# Only a keyed hash of each code is ever stored, and a code is only ever
+# checked against the recipient and type it was sent for, so a guess can
+# only ever hit one account. After OTP_MAX_ATTEMPTS wrong guesses the code
+# is deleted and a new one has to be sent. Both stores answer the same
+# three calls, and OTP_STORE picks one: the database store (indexed lookups,
+# expiry enforced in the query, purge_otps deletes old rows) or the cache
+# store, which never touches the database and lets the cache expire codes.
+
+
+def identifier_for(user, type):
+    return (user.email if type == 'email' else user.phone_number) or ''
+
+
+def type_for(identifier):
+    """The kind of code sent to `identifier`, an email address or a phone number."""
+    return 'email' if '@' in identifier else 'phone'
+
+
+class DatabaseOTPStore:
+    def issue(self, user, type):
+        """Create a fresh code for `user`, replacing any earlier one of the same type."""
+        OTP.objects.filter(user=user, type=type).delete()
+        otp = OTP.objects.create(user=user, type=type, identifier=identifier_for(user, type))
+        return otp.code
+
+    def verify(self, code, identifier, type):
+        """Consume a valid code of `type` sent to `identifier` and return (user, type), or None."""
+        otp = OTP.objects.matching(code, identifier, type).select_related('user').order_by('-created_at').first()
+        if otp is None:
+            self.fail(identifier, type)
+            return None
+        # Only the request that actually deletes the row gets to use it
+        deleted, _ = OTP.objects.filter(pk=otp.pk).delete()
+        return (otp.user, otp.type) if deleted else None
+
+    def fail(self, identifier, type):
+        """Count a wrong guess against the codes sent to `identifier`, dropping those out of tries."""
+        sent = OTP.objects.filter(identifier=identifier, type=type)
+        if sent.update(attempts=F('attempts') + 1):
+            sent.filter(attempts__gte=settings.OTP_MAX_ATTEMPTS).delete()
+
+    def purge_expired(self, batch_size=1000):
+        """Delete expired codes in batches so the purge never holds one long lock."""
+        total = 0
+        expired = OTP.objects.filter(expires_at__lte=timezone.now()).order_by('expires_at')
+        while True:
+            ids = list(expired.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return total
+            total += OTP.objects.filter(id__in=ids).delete()[0]
+
+
+class CacheOTPStore:
+    """Codes live only in the cache, one per recipient and type, and expire with it."""
+    key_prefix = 'otp:'
+
+    def key(self, identifier, type):
+        return f'{self.key_prefix}{type}:{hash_code(identifier)}'
+
+    def attempts_key(self, identifier, type):
+        return f'{self.key(identifier, type)}:attempts'
+
+    def issue(self, user, type):
+        code = generate_code()
+        # set() replaces any earlier code of the same type, like the database store
+        value = {'user_id': user.pk, 'code_hash': hash_code(code)}
+        identifier = identifier_for(user, type)
+        cache.set(self.key(identifier, type), value, settings.OTP_TTL_SECONDS)
+        cache.delete(self.attempts_key(identifier, type))
+        return code
+
+    def verify(self, code, identifier, type):
+        key = self.key(identifier, type)
+        value = cache.get(key)
+        if value is None:
+            return None
+        if not constant_time_compare(value['code_hash'], hash_code(code)):
+            self.fail(identifier, type)
+            return None
+        # Only the request that actually deletes the key gets to use it
+        if not cache.delete(key):
+            return None
+        user = User.objects.filter(pk=value['user_id']).first()
+        return (user, type) if user else None
+
+    def fail(self, identifier, type):
+        attempts_key = self.attempts_key(identifier, type)
+        # incr() is atomic, so parallel guesses can't share one try
+        if cache.add(attempts_key, 1, settings.OTP_TTL_SECONDS):
+            attempts = 1
+        else:
+            try:
+                attempts = cache.incr(attempts_key)
+            except ValueError:
+                attempts = 1
+        if attempts >= settings.OTP_MAX_ATTEMPTS:
+            cache.delete_many([self.key(identifier, type), attempts_key])
+
+    def purge_expired(self, batch_size=1000):
+        return 0
+
+
+def get_otp_store():
+    return import_string(settings.OTP_STORE)()
@@ -0,0 +1,210 @@
+import json
+import sys
+import threading
+import uuid
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OutboundMessage
+
+# Outbound email/SMS queue.
+# Web requests only enqueue() a row; the process_outbound worker claims due
+# rows in batches and hands them to the backend configured for their channel
+# in OUTBOUND_BACKENDS. Backends are opened once per worker thread and reused
+# across batches, so an SMTP session or Twilio client outlives a single OTP.
+# Failed sends are retried with exponential backoff until
+# OUTBOUND_MAX_ATTEMPTS, then left as failed for the admin to inspect.
+# Messages with expires_at carry a one-time code: their body is blanked as
+# soon as they are sent, they are never sent after expiring, and
+# purge_expired() deletes them once sent or expired.
+
+
+def enqueue(channel, recipient, body, subject='', expires_at=None):
+    return OutboundMessage.objects.create(
+        channel=channel, recipient=recipient, subject=subject, body=body, expires_at=expires_at,
+    )
+
+
+class BaseBackend:
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send(self, message):
+        """Deliver one OutboundMessage, raising on failure."""
+        raise NotImplementedError
+
+    def send_batch(self, messages):
+        """Return {message id: error or None} for every message."""
+        errors = {}
+        for message in messages:
+            try:
+                self.send(message)
+                errors[message.pk] = None
+            except Exception as e:
+                errors[message.pk] = e
+                # Drop a connection that may be broken; the next send reopens it
+                self.close()
+        return errors
+
+
+class EmailBackend(BaseBackend):
+    """Sends through Django's EMAIL_BACKEND over one connection kept open across batches."""
+
+    def __init__(self):
+        self.connection = None
+
+    def open(self):
+        if self.connection is None:
+            self.connection = get_connection(fail_silently=False)
+            self.connection.open()
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            finally:
+                self.connection = None
+
+    def send(self, message):
+        self.open()
+        email = EmailMessage(message.subject, message.body, settings.EMAIL_HOST_USER, [message.recipient])
+        self.connection.send_messages([email])
+
+
+@lru_cache(maxsize=None)
+def twilio_client():
+    # One client (and its HTTP session pool) for the whole process
+    from twilio.rest import Client
+    return Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+
+
+class TwilioSMSBackend(BaseBackend):
+    def send(self, message):
+        twilio_client().messages.create(body=message.body, from_=settings.TWILIO_PHONE_NUMBER, to=message.recipient)
+
+
+class ConsoleBackend(BaseBackend):
+    lock = threading.Lock()
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def send(self, message):
+        with self.lock:
+            subject = f'{message.subject}: ' if message.subject else ''
+            self.stream.write(f'[{message.channel}] to {message.recipient}: {subject}{message.body}\n')
+            self.stream.flush()
+
+
+class FileBackend(BaseBackend):
+    """Appends one JSON line per message to OUTBOUND_FILE_PATH."""
+    lock = threading.Lock()
+
+    def send(self, message):
+        line = json.dumps({
+            'id': message.pk, 'channel': message.channel, 'recipient': message.recipient,
+            'subject': message.subject, 'body': message.body,
+        })
+        with self.lock, open(settings.OUTBOUND_FILE_PATH, 'a') as f:
+            f.write(line + '\n')
+
+
+def get_backends():
+    return {channel: import_string(path)() for channel, path in settings.OUTBOUND_BACKENDS.items()}
+
+
+def claim(batch_size, worker_id=None):
+    """
+    Mark up to `batch_size` due messages as sending for this worker and
+    return them. Rows left in sending by a crashed worker are picked up
+    again once their lease runs out.
+    """
+    worker_id = worker_id or uuid.uuid4().hex
+    now = timezone.now()
+    expired = now - timedelta(seconds=settings.OUTBOUND_LEASE_SECONDS)
+    due = Q(status=OutboundMessage.PENDING, next_attempt_at__lte=now) | Q(status=OutboundMessage.SENDING, claimed_at__lt=expired)
+    due &= Q(expires_at__isnull=True) | Q(expires_at__gt=now)
+    with transaction.atomic():
+        ids = list(
+            OutboundMessage.objects.filter(due).order_by('next_attempt_at', 'id').values_list('id', flat=True)[:batch_size]
+        )
+        # Re-checking `due` makes the UPDATE a compare-and-set, so two workers never claim the same row
+        OutboundMessage.objects.filter(due, id__in=ids).update(
+            status=OutboundMessage.SENDING, claimed_by=worker_id, claimed_at=now,
+        )
+    return list(OutboundMessage.objects.filter(claimed_by=worker_id, status=OutboundMessage.SENDING, claimed_at=now))
+
+
+def retry_delay(attempts):
+    delay = settings.OUTBOUND_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+    return timedelta(seconds=min(delay, settings.OUTBOUND_RETRY_MAX_SECONDS))
+
+
+def deliver(messages, backends):
+    """Send claimed messages and record the outcome of each one. Returns (sent, failed)."""
+    by_channel = {}
+    for message in messages:
+        by_channel.setdefault(message.channel, []).append(message)
+
+    now = timezone.now()
+    sent, failed = [], []
+    for channel, batch in by_channel.items():
+        backend = backends.get(channel)
+        if backend is None:
+            errors = {message.pk: LookupError(f'No outbound backend for {channel!r}') for message in batch}
+        else:
+            errors = backend.send_batch(batch)
+        for message in batch:
+            message.attempts += 1
+            error = errors[message.pk]
+            if error is None:
+                message.status = OutboundMessage.SENT
+                message.sent_at = now
+                message.last_error = ''
+                if message.expires_at:
+                    message.body = ''
+                sent.append(message)
+                continue
+            message.last_error = str(error) or error.__class__.__name__
+            if message.attempts >= settings.OUTBOUND_MAX_ATTEMPTS:
+                message.status = OutboundMessage.FAILED
+            else:
+                message.status = OutboundMessage.PENDING
+                message.next_attempt_at = now + retry_delay(message.attempts)
+            failed.append(message)
+
+    OutboundMessage.objects.bulk_update(
+        sent + failed, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at', 'body'],
+    )
+    return len(sent), len(failed)
+
+
+def purge_expired(batch_size=1000):
+    """Delete sent or expired one-time-code messages in batches; returns how many."""
+    total = 0
+    done = OutboundMessage.objects.filter(
+        Q(status=OutboundMessage.SENT) | Q(expires_at__lte=timezone.now()), expires_at__isnull=False,
+    ).order_by('id')
+    while True:
+        ids = list(done.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return total
+        total += OutboundMessage.objects.filter(id__in=ids).delete()[0]
+
+
+def process_batch(backends, batch_size=None, worker_id=None):
+    """Claim and deliver one batch. Returns the number of messages handled."""
+    messages = claim(batch_size or settings.OUTBOUND_BATCH_SIZE, worker_id)
+    if messages:
+        deliver(messages, backends)
+    return len(messages)
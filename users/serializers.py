@@ -24,6 +24,8 @@ class SignupSerializer(serializers.Serializer):
 
 class VerificationSerializer(serializers.Serializer):
     code = serializers.CharField(max_length=6)
+    # The address or number the code was sent to; codes are only checked per recipient
+    email_or_phone = serializers.CharField()
 
 class ProfileUpdateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -1,12 +1,29 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from django.test import RequestFactory, TestCase, override_settings
+from django.core.management import call_command
+from django.utils import timezone
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
-from .models import User, OTP
+from .models import User, OTP, OutboundMessage, cache_user, get_cached_user
+from .authentication import CachedJWTAuthentication
+from . import outbound
+from .otp import CacheOTPStore, DatabaseOTPStore
+from .throttling import SlidingWindow, client_ip, parse_rate
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
 from .views import SignupView
 
 class UserTests(TestCase):
     def setUp(self):
+        cache.clear()  # rate-limit counters live in the cache
         self.client = APIClient()
         self.user_data = {'email': 'test@example.com', 'password': 'testpass', 'age': 25}
 
@@ -18,7 +35,7 @@ class UserTests(TestCase):
         # Simulate OTP (in test, we can't send real email)
         user = User.objects.get(email='test@example.com')
         otp = OTP.objects.create(user=user, code='123456', type='email')
-        response = self.client.post(reverse('verify'), {'code': '123456'})
+        response = self.client.post(reverse('verify'), {'code': '123456', 'email_or_phone': 'test@example.com'})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         user.refresh_from_db()
         self.assertTrue(user.is_verified)
@@ -59,4 +76,343 @@ class UserTests(TestCase):
         for _ in range(6):  # Exceed 5
             self.client.post(reverse('signup'), self.user_data)
         response = self.client.post(reverse('signup'), self.user_data)
-        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+class FlakyBackend(outbound.BaseBackend):
+    def send(self, message):
+        raise ConnectionError('provider down')
+
+
+@override_settings(OUTBOUND_BACKENDS={'email': 'users.outbound.FileBackend', 'sms': 'users.outbound.FileBackend'})
+class OutboundTests(TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.jsonl')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+        self.settings_override = override_settings(OUTBOUND_FILE_PATH=self.path)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def delivered(self):
+        with open(self.path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_signup_only_enqueues(self):
+        user = User.objects.create_user(username='queued', email='queued@example.com')
+        SignupView().send_email_otp(user)
+        message = OutboundMessage.objects.get()
+        self.assertEqual((message.channel, message.recipient, message.status), ('email', 'queued@example.com', 'pending'))
+        code = message.body.rsplit(' ', 1)[-1]
+        self.assertEqual(DatabaseOTPStore().verify(code, 'queued@example.com', 'email'), (user, 'email'))
+        self.assertEqual(self.delivered(), [])
+
+    def test_worker_drains_queue(self):
+        outbound.enqueue('email', 'a@example.com', 'code 1', subject='Your OTP Code')
+        outbound.enqueue('sms', '+911234567890', 'code 2')
+        call_command('process_outbound', workers=1, once=True, stdout=StringIO())
+        self.assertEqual({m['recipient'] for m in self.delivered()}, {'a@example.com', '+911234567890'})
+        self.assertEqual(set(OutboundMessage.objects.values_list('status', flat=True)), {'sent'})
+
+    def test_code_messages_do_not_keep_the_code(self):
+        user = User.objects.create_user(username='secret', email='secret@example.com')
+        SignupView().send_email_otp(user)
+        late = outbound.enqueue('sms', '+911234567890', 'code 9', expires_at=timezone.now() - timedelta(seconds=1))
+        plain = outbound.enqueue('email', 'news@example.com', 'Newsletter')
+        call_command('process_outbound', workers=1, once=True, stdout=StringIO())
+        self.assertEqual({m['recipient'] for m in self.delivered()}, {'secret@example.com', 'news@example.com'})
+        sent = OutboundMessage.objects.get(recipient='secret@example.com')
+        self.assertEqual((sent.status, sent.body), ('sent', ''))
+        self.assertEqual(OutboundMessage.objects.get(pk=late.pk).status, 'pending')
+        out = StringIO()
+        call_command('purge_otps', stdout=out)
+        self.assertIn('2 code messages', out.getvalue())
+        self.assertEqual(list(OutboundMessage.objects.all()), [plain])
+
+    def test_claimed_rows_are_not_claimed_twice(self):
+        for i in range(3):
+            outbound.enqueue('email', f'{i}@example.com', 'code')
+        first = outbound.claim(2, 'worker-a')
+        second = outbound.claim(2, 'worker-b')
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+        self.assertFalse({m.pk for m in first} & {m.pk for m in second})
+
+    @override_settings(OUTBOUND_MAX_ATTEMPTS=2, OUTBOUND_RETRY_BASE_SECONDS=30)
+    def test_retry_with_backoff_then_fail(self):
+        message = outbound.enqueue('email', 'a@example.com', 'code')
+        backends = {'email': FlakyBackend()}
+        before = timezone.now()
+        self.assertEqual(outbound.process_batch(backends), 1)
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts, message.last_error), ('pending', 1, 'provider down'))
+        self.assertGreaterEqual(message.next_attempt_at, before + timedelta(seconds=30))
+        # Not due yet
+        self.assertEqual(outbound.process_batch(backends), 0)
+        OutboundMessage.objects.update(next_attempt_at=timezone.now())
+        outbound.process_batch(backends)
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ('failed', 2))
+        self.assertEqual(outbound.retry_delay(20), timedelta(seconds=3600))
+
+    def test_email_backend_reuses_one_connection(self):
+        for i in range(3):
+            outbound.enqueue('email', f'{i}@example.com', 'code', subject='Your OTP Code')
+        backend = outbound.EmailBackend()
+        outbound.process_batch({'email': backend})
+        connection = backend.connection
+        outbound.enqueue('email', 'later@example.com', 'code')
+        outbound.process_batch({'email': backend})
+        self.assertIs(backend.connection, connection)
+        self.assertEqual(OutboundMessage.objects.filter(status='sent').count(), 4)
+
+
+class OTPStoreTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='otp', email='otp@example.com', phone_number='+919876543210')
+
+    def test_database_store_hashes_and_consumes(self):
+        store = DatabaseOTPStore()
+        code = store.issue(self.user, 'email')
+        otp = OTP.objects.get()
+        self.assertEqual(otp.identifier, 'otp@example.com')
+        self.assertNotIn(code, otp.code_hash)
+        self.assertIsNone(store.verify(code, 'someone@example.com', 'email'))
+        self.assertIsNone(store.verify(code, 'otp@example.com', 'phone'))
+        self.assertEqual(store.verify(code, 'otp@example.com', 'email'), (self.user, 'email'))
+        self.assertIsNone(store.verify(code, 'otp@example.com', 'email'))
+
+    def test_new_code_replaces_old_one(self):
+        store = DatabaseOTPStore()
+        old = store.issue(self.user, 'phone')
+        new = store.issue(self.user, 'phone')
+        self.assertEqual(OTP.objects.count(), 1)
+        if old != new:
+            self.assertIsNone(store.verify(old, '+919876543210', 'phone'))
+        self.assertEqual(store.verify(new, '+919876543210', 'phone'), (self.user, 'phone'))
+
+    def test_expiry_is_enforced_in_the_query(self):
+        store = DatabaseOTPStore()
+        code = store.issue(self.user, 'email')
+        OTP.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIsNone(store.verify(code, 'otp@example.com', 'email'))
+        self.assertIn('expires_at', queries.captured_queries[0]['sql'])
+
+    def test_purge_in_batches(self):
+        for i in range(5):
+            OTP.objects.create(user=self.user, type='email', expires_at=timezone.now() - timedelta(minutes=i + 1))
+        live = OTP.objects.create(user=self.user, type='email')
+        out = StringIO()
+        call_command('purge_otps', batch_size=2, stdout=out)
+        self.assertIn('Deleted 5', out.getvalue())
+        self.assertEqual(list(OTP.objects.all()), [live])
+
+    @override_settings(OTP_STORE='users.otp.CacheOTPStore')
+    def test_cache_store_skips_database(self):
+        cache.clear()
+        store = CacheOTPStore()
+        with CaptureQueriesContext(connection) as queries:
+            code = store.issue(self.user, 'email')
+        self.assertEqual(len(queries.captured_queries), 0)
+        self.assertFalse(OTP.objects.exists())
+        self.assertIsNone(store.verify(code, 'otp@example.com', 'phone'))
+        self.assertIsNone(store.verify(code, 'someone@example.com', 'email'))
+        self.assertEqual(store.verify(code, 'otp@example.com', 'email'), (self.user, 'email'))
+        self.assertIsNone(store.verify(code, 'otp@example.com', 'email'))
+        # A newer code replaces the old one
+        old, new = store.issue(self.user, 'phone'), store.issue(self.user, 'phone')
+        if old != new:
+            self.assertIsNone(store.verify(old, '+919876543210', 'phone'))
+        self.assertEqual(store.verify(new, '+919876543210', 'phone'), (self.user, 'phone'))
+
+    @override_settings(OTP_MAX_ATTEMPTS=3)
+    def test_wrong_guesses_use_up_the_code(self):
+        cache.clear()
+        for store in (DatabaseOTPStore(), CacheOTPStore()):
+            with self.subTest(store=type(store).__name__):
+                code = store.issue(self.user, 'email')
+                wrong = '000000' if code != '000000' else '111111'
+                for _ in range(2):
+                    self.assertIsNone(store.verify(wrong, 'otp@example.com', 'email'))
+                # The third wrong guess is the last; the right code no longer works either
+                self.assertIsNone(store.verify(wrong, 'otp@example.com', 'email'))
+                self.assertIsNone(store.verify(code, 'otp@example.com', 'email'))
+                # A fresh code starts over
+                code = store.issue(self.user, 'email')
+                self.assertIsNone(store.verify(wrong, 'otp@example.com', 'email'))
+                self.assertEqual(store.verify(code, 'otp@example.com', 'email'), (self.user, 'email'))
+
+    def test_verify_requires_the_recipient(self):
+        code = DatabaseOTPStore().issue(self.user, 'email')
+        response = APIClient().post(reverse('verify'), {'code': code})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('email_or_phone', response.data)
+        self.assertTrue(OTP.objects.exists())
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        SlidingWindow.closed_windows.clear()
+        self.client = APIClient()
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('5/m'), (5, 60))
+        self.assertEqual(parse_rate('100/15m'), (100, 900))
+
+    def test_sliding_window_weights_previous_window(self):
+        window = SlidingWindow(limit=4, period=60)
+        start = 6000.0  # a window boundary
+        for _ in range(4):
+            self.assertTrue(window.hit('k', now=start + 50)[0])
+        self.assertFalse(window.hit('k', now=start + 55)[0])
+        # 15s into the next window 3/4 of the previous one still counts: 5 * 0.75 > 4
+        allowed, retry_after = window.hit('k', now=start + 75)
+        self.assertFalse(allowed)
+        self.assertGreater(retry_after, 0)
+        # Near the end of it the previous window has almost slid out
+        self.assertTrue(window.hit('k', now=start + 118)[0])
+        self.assertTrue(window.hit('other', now=start + 75)[0])
+
+    def test_limit_is_per_client(self):
+        data = {'code': '000000', 'email_or_phone': 'nobody@example.com'}
+        for _ in range(5):
+            self.client.post(reverse('verify'), data, REMOTE_ADDR='10.0.0.1')
+        response = self.client.post(reverse('verify'), data, REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+        response = self.client.post(reverse('verify'), dict(data, email_or_phone='other@example.com'), REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_verify_and_signup_are_keyed_by_target(self):
+        for url, data in (
+            (reverse('verify'), {'code': '000000', 'email_or_phone': 'victim@example.com'}),
+            (reverse('signup'), {'email': 'victim@example.com', 'password': 'testpass'}),
+        ):
+            with self.subTest(url=url):
+                for i in range(5):
+                    self.client.post(url, data, REMOTE_ADDR=f'10.0.2.{i}')
+                response = self.client.post(url, data, REMOTE_ADDR='10.0.2.9')
+                self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_client_ip_ignores_forged_forwarded_entries(self):
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.5', HTTP_X_FORWARDED_FOR='1.2.3.4, 203.0.113.7, 10.0.0.1')
+        self.assertEqual(client_ip(request), '10.0.0.5')
+        with override_settings(RATELIMIT_IP_META_KEY='HTTP_X_FORWARDED_FOR'):
+            self.assertEqual(client_ip(request), '10.0.0.1')
+            with override_settings(RATELIMIT_TRUSTED_PROXIES=2):
+                self.assertEqual(client_ip(request), '203.0.113.7')
+            with override_settings(RATELIMIT_TRUSTED_PROXIES=5):
+                self.assertEqual(client_ip(request), '1.2.3.4')
+
+    def test_password_reset_is_keyed_by_target(self):
+        for i in range(5):
+            self.client.post(reverse('password_reset'), {'email_or_phone': 'victim@example.com'}, REMOTE_ADDR=f'10.0.1.{i}')
+        response = self.client.post(reverse('password_reset'), {'email_or_phone': 'VICTIM@example.com'}, REMOTE_ADDR='10.0.1.9')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(RATELIMIT_ENABLE=False)
+    def test_can_be_disabled(self):
+        for _ in range(7):
+            response = self.client.post(reverse('verify'), {'code': '000000', 'email_or_phone': 'nobody@example.com'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_one_cache_call_per_request(self):
+        window = SlidingWindow(limit=100, period=60)
+        window.hit('k', now=6010.0)
+        window.hit('k', now=6011.0)  # previous window's count is remembered now
+        calls = []
+        original = window.cache.incr
+        window.cache.incr = lambda *args, **kwargs: calls.append('incr') or original(*args, **kwargs)
+        window.cache.get = lambda *args, **kwargs: calls.append('get')
+        try:
+            window.hit('k', now=6012.0)
+        finally:
+            del window.cache.incr, window.cache.get
+        self.assertEqual(calls, ['incr'])
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='jwt', email='jwt@example.com', password='pass')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def authenticate(self):
+        token = RefreshToken.for_user(self.user).access_token
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return CachedJWTAuthentication().authenticate(request)[0]
+
+    def test_user_comes_from_cache(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as cold:
+            self.assertEqual(self.client.get(reverse('profile')).status_code, status.HTTP_200_OK)
+        self.assertEqual(len(cold.captured_queries), 1)
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+            self.assertTrue(user and user.is_authenticated)
+            self.assertEqual(user.pk, self.user.pk)
+        # The rest of the user is loaded when a view reads it
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(reverse('profile')).data['email'], 'jwt@example.com')
+
+    def test_cache_keeps_no_password_hash(self):
+        self.client.get(reverse('profile'))
+        entry, _ = get_cached_user(self.user.pk)
+        self.assertEqual(set(entry), {'is_active', 'password'})
+        self.assertNotEqual(entry['password'], self.user.password)
+
+    def test_row_loaded_before_a_write_is_not_served_after_it(self):
+        # A request misses and loads the row, then a deactivation commits
+        # before it gets to cache what it loaded
+        entry, version = get_cached_user(self.user.pk)
+        self.assertIsNone(entry)
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=self.user.pk).update(is_active=False)
+        cache_user(self.user.pk, version, {'is_active': True, 'password': get_md5_hash_password(self.user.password)})
+        self.assertEqual(self.client.get(reverse('profile')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_profile_update_refreshes_cache(self):
+        self.client.get(reverse('profile'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.put(reverse('profile'), {'age': 30}).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(reverse('profile')).data['age'], 30)
+
+    def test_verification_refreshes_cache(self):
+        self.client.get(reverse('profile'))
+        code = DatabaseOTPStore().issue(self.user, 'email')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('verify'), {'code': code, 'email_or_phone': self.user.email})
+        self.assertTrue(self.client.get(reverse('profile')).data['is_verified'])
+
+    def test_deactivated_and_deleted_users_are_rejected(self):
+        self.client.get(reverse('profile'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.get(reverse('profile')).status_code, status.HTTP_401_UNAUTHORIZED)
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=self.user.pk).update(is_active=True)
+        self.assertEqual(self.client.get(reverse('profile')).status_code, status.HTTP_200_OK)
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get(reverse('profile')).status_code, status.HTTP_401_UNAUTHORIZED)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertEqual(self.client.get(reverse('profile')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_rolled_back_changes_are_never_cached(self):
+        self.client.get(reverse('profile'))
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    self.user.age = 99
+                    self.user.save()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertIsNone(self.client.get(reverse('profile')).data['age'])
+
@@ -0,0 +1,137 @@
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+# Cache-backed sliding-window rate limiting.
+# Counters live in the RATELIMIT_CACHE cache, so every worker process
+# enforces the same limit, and are keyed per client (IP, user or the
+# email/phone in the request) instead of per view. Each window is a counter
+# bumped with one atomic incr(); the previous window's count is weighted by
+# how much of it still overlaps the sliding window. A window that has ended
+# never changes again, so its count is read from the cache once per process
+# and remembered, leaving the incr() as the only cache call per request.
+
+UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'5/m' -> (5, 60); '100/15m' -> (100, 900)."""
+    calls, period = rate.split('/')
+    multiplier = int(period[:-1]) if len(period) > 1 else 1
+    return int(calls), multiplier * UNITS[period[-1]]
+
+
+def client_ip(request):
+    value = request.META.get(settings.RATELIMIT_IP_META_KEY, '')
+    # Every proxy appends the address it got the request from to an
+    # X-Forwarded-For style header, and the client can write anything before
+    # that, so only the entry our own outermost proxy added can be trusted
+    entries = [entry.strip() for entry in value.split(',')]
+    return entries[max(len(entries) - settings.RATELIMIT_TRUSTED_PROXIES, 0)]
+
+
+def key_ip(request):
+    return f'ip:{client_ip(request)}'
+
+
+def key_user(request):
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return key_ip(request)
+
+
+def key_identifier(request):
+    """The email or phone number a request acts on, so one target can't be flooded from many IPs."""
+    data = request.data
+    value = data.get('email') or data.get('phone_number') or data.get('email_or_phone')
+    if value:
+        return f'id:{str(value).strip().lower()}'
+    return key_ip(request)
+
+
+KEYS = {'ip': key_ip, 'user': key_user, 'identifier': key_identifier}
+
+
+class SlidingWindow:
+    closed_windows = OrderedDict()  # (cache key) -> final count, shared by every limiter in the process
+    closed_windows_max = 10000
+    lock = threading.Lock()
+
+    def __init__(self, limit, period):
+        self.limit = limit
+        self.period = period
+        self.cache = caches[settings.RATELIMIT_CACHE]
+
+    def cache_key(self, key, window):
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        return f'rl:{digest}:{self.period}:{window}'
+
+    def incr(self, cache_key):
+        try:
+            return self.cache.incr(cache_key)
+        except ValueError:
+            # First hit of the window; keep it around for the next window to read
+            if self.cache.add(cache_key, 1, timeout=self.period * 2):
+                return 1
+            return self.cache.incr(cache_key)
+
+    def closed_count(self, cache_key):
+        with self.lock:
+            if cache_key in self.closed_windows:
+                self.closed_windows.move_to_end(cache_key)
+                return self.closed_windows[cache_key]
+        count = self.cache.get(cache_key, 0)
+        with self.lock:
+            self.closed_windows[cache_key] = count
+            if len(self.closed_windows) > self.closed_windows_max:
+                self.closed_windows.popitem(last=False)
+        return count
+
+    def hit(self, key, now=None):
+        """Count one request for `key`. Returns (allowed, seconds until the next attempt may pass)."""
+        now = time.time() if now is None else now
+        window, offset = divmod(now, self.period)
+        window = int(window)
+        count = self.incr(self.cache_key(key, window))
+        if count > self.limit:
+            return False, math.ceil(self.period - offset)
+        overlap = 1 - offset / self.period
+        previous = self.closed_count(self.cache_key(key, window - 1))
+        if count + previous * overlap <= self.limit:
+            return True, 0
+        # Wait until enough of the previous window has slid out
+        excess = count + previous * overlap - self.limit
+        return False, math.ceil(excess / previous * self.period)
+
+
+def rate_limit(rate, key='ip', group=None):
+    """
+    Limit an APIView method to `rate` requests per client, answering 429
+    with Retry-After once the client is over. `key` is 'ip', 'user',
+    'identifier' or a callable taking the request.
+    """
+    limit, period = parse_rate(rate)
+    key_func = KEYS[key] if isinstance(key, str) else key
+
+    def decorator(view_method):
+        prefix = group or view_method.__qualname__
+
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if settings.RATELIMIT_ENABLE:
+                allowed, retry_after = SlidingWindow(limit, period).hit(f'{prefix}:{key_func(request)}')
+                if not allowed:
+                    response = Response({"error": "Rate limit exceeded"}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+                    response['Retry-After'] = str(retry_after)
+                    return response
+            return view_method(self, request, *args, **kwargs)
+        return wrapper
+    return decorator
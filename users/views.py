@@ -4,23 +4,27 @@ from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate, login
-from django.core.mail import send_mail
 from django.conf import settings
 from django.utils import timezone
-from twilio.rest import Client
-from ratelimit import limits, RateLimitException
 from allauth.socialaccount.providers.google.views import GoogleOAuth2Adapter
 from allauth.account.utils import complete_social_login
 from django.http import HttpResponseRedirect
-from .models import User, OTP
+from .models import User
+from . import outbound
+from .otp import get_otp_store, type_for
+from .throttling import rate_limit
 from .serializers import UserSerializer, SignupSerializer, VerificationSerializer, ProfileUpdateSerializer, PasswordResetSerializer
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Rate limit: 5 requests per minute for sensitive views
-SIXTY_SECONDS = 60
-FIVE_CALLS = 5
+# Rate limit: 5 requests per minute per client for sensitive views, and
+# per email/phone too, so a pool of IPs can't flood or brute-force one account
+OTP_RATE = '5/m'
+
+
+def otp_expiry():
+    return timezone.now() + timezone.timedelta(seconds=settings.OTP_TTL_SECONDS)
 
 class HomeView(APIView):
     permission_classes = [AllowAny]
@@ -34,7 +38,8 @@ class HomeView(APIView):
 class SignupView(APIView):
     permission_classes = [AllowAny]
 
-    @limits(calls=FIVE_CALLS, period=SIXTY_SECONDS)
+    @rate_limit(OTP_RATE, key='ip')
+    @rate_limit(OTP_RATE, key='identifier')
     def post(self, request):
         try:
             serializer = SignupSerializer(data=request.data)
@@ -48,10 +53,8 @@ class SignupView(APIView):
                     'preferred_city': data.get('preferred_city'),
                     'user_type': data.get('user_type'),
                 }
-                user = User.objects.create_user(**user_kwargs)
-                if data.get('password'):
-                    user.set_password(data['password'])
-                    user.save()
+                # Hashing the password here saves a second UPDATE
+                user = User.objects.create_user(password=data.get('password'), **user_kwargs)
                 # Send verification
                 if data.get('email'):
                     self.send_email_otp(user)
@@ -59,52 +62,44 @@ class SignupView(APIView):
                     self.send_phone_otp(user)
                 return Response({"message": "User created. Verify OTP."}, status=status.HTTP_201_CREATED)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-        except RateLimitException:
-            return Response({"error": "Rate limit exceeded"}, status=status.HTTP_429_TOO_MANY_REQUESTS)
         except Exception as e:
             logger.error(f"Signup error: {str(e)}")
             return Response({"error": "Internal error"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    # OTPs are only queued here; the process_outbound worker delivers them.
+    # The message expires with the code, so its plain copy doesn't outlive it
     def send_email_otp(self, user):
-        otp = OTP.objects.create(user=user, type='email')
-        send_mail(
-            'Your OTP Code',
-            f'Your verification code is {otp.code}',
-            settings.EMAIL_HOST_USER,
-            [user.email],
-            fail_silently=False,
-        )
+        code = get_otp_store().issue(user, 'email')
+        outbound.enqueue('email', user.email, f'Your verification code is {code}', subject='Your OTP Code',
+                         expires_at=otp_expiry())
 
     def send_phone_otp(self, user):
-        otp = OTP.objects.create(user=user, type='phone')
-        client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-        client.messages.create(
-            body=f'Your verification code is {otp.code}',
-            from_=settings.TWILIO_PHONE_NUMBER,
-            to=user.phone_number
-        )
+        code = get_otp_store().issue(user, 'phone')
+        outbound.enqueue('sms', user.phone_number, f'Your verification code is {code}', expires_at=otp_expiry())
 
 class VerificationView(APIView):
     permission_classes = [AllowAny]
 
-    @limits(calls=FIVE_CALLS, period=SIXTY_SECONDS)
+    @rate_limit(OTP_RATE, key='ip')
+    @rate_limit(OTP_RATE, key='identifier')
     def post(self, request):
         try:
             serializer = VerificationSerializer(data=request.data)
             if serializer.is_valid():
                 code = serializer.validated_data['code']
-                otp = OTP.objects.filter(code=code).first()
-                if otp and otp.is_valid():
-                    user = otp.user
-                    if otp.type == 'email':
+                identifier = serializer.validated_data['email_or_phone']
+                # verify() consumes the code, so it is one-time use
+                verified = get_otp_store().verify(code, identifier, type_for(identifier))
+                if verified:
+                    user, otp_type = verified
+                    if otp_type == 'email':
                         user.email_verified = True
-                    elif otp.type == 'phone':
+                    elif otp_type == 'phone':
                         user.phone_verified = True
                     user.is_verified = user.email_verified or user.phone_verified
                     user.save()
-                    otp.delete()  # One-time use
                     # Log in user and generate tokens for persistent session
-                    login(request, user)
+                    login(request, user, backend='django.contrib.auth.backends.ModelBackend')
                     refresh = RefreshToken.for_user(user)
                     return Response({
                         "message": "Verified successfully",
@@ -113,8 +108,6 @@ class VerificationView(APIView):
                     })
                 return Response({"error": "Invalid or expired OTP"}, status=status.HTTP_400_BAD_REQUEST)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-        except RateLimitException:
-            return Response({"error": "Rate limit exceeded"}, status=status.HTTP_429_TOO_MANY_REQUESTS)
         except Exception as e:
             logger.error(f"Verification error: {str(e)}")
             return Response({"error": "Internal error"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -168,7 +161,7 @@ class ProfileView(APIView):
 class PasswordResetView(APIView):
     permission_classes = [AllowAny]
 
-    @limits(calls=FIVE_CALLS, period=SIXTY_SECONDS)
+    @rate_limit(OTP_RATE, key='identifier')
     def post(self, request):
         try:
             serializer = PasswordResetSerializer(data=request.data)
@@ -189,16 +182,13 @@ class PasswordResetView(APIView):
                 # Step 2: Verify code and reset password
                 code = data['code']
                 new_password = data.get('new_password')
-                otp = OTP.objects.filter(user=user, code=code).first()
-                if otp and otp.is_valid():
+                verified = get_otp_store().verify(code, email_or_phone, type_for(email_or_phone))
+                if verified and verified[0] == user:
                     user.set_password(new_password)
                     user.save()
-                    otp.delete()
                     return Response({"message": "Password reset successfully"})
                 return Response({"error": "Invalid or expired OTP"}, status=status.HTTP_400_BAD_REQUEST)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-        except RateLimitException:
-            return Response({"error": "Rate limit exceeded"}, status=status.HTTP_429_TOO_MANY_REQUESTS)
         except Exception as e:
             logger.error(f"Password reset error: {str(e)}")
             return Response({"error": "Internal error"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file